@@ -3,7 +3,8 @@ from __future__ import annotations
 from typing import List, Dict, Any, Optional, Tuple
 import os
 import time
-import requests
+
+from core.adapters import transport
 
 HEYGEN_API_KEY = os.getenv("HEYGEN_API_KEY", "")
 API_BASE = "https://api.heygen.com"
@@ -28,7 +29,7 @@ def _headers(as_json: bool = False) -> Dict[str, str]:
 def _json_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: int = 60) -> Dict[str, Any]:
     if not HEYGEN_API_KEY:
         return {}
-    r = requests.get(url, headers=_headers(False), params=params or {}, timeout=timeout)
+    r = transport.get(url, headers=_headers(False), params=params or {}, timeout=timeout)
     r.raise_for_status()
     try:
         return r.json() or {}
@@ -39,7 +40,7 @@ def _json_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: int =
 def _json_post(url: str, payload: Dict[str, Any], timeout: int = 180) -> Dict[str, Any]:
     if not HEYGEN_API_KEY:
         return {}
-    r = requests.post(url, headers=_headers(True), json=payload, timeout=timeout)
+    r = transport.post(url, headers=_headers(True), json=payload, timeout=timeout)
     if r.status_code >= 400:
         try:
             body = r.json()
@@ -227,7 +228,7 @@ def upload_audio_asset(mp3_bytes: bytes, filename: Optional[str] = None, content
     headers = {"X-Api-Key": HEYGEN_API_KEY, "Content-Type": content_type}
     if filename:
         headers["Content-Disposition"] = f'inline; filename="{filename}"'
-    r = requests.post(url, headers=headers, data=mp3_bytes, timeout=180)
+    r = transport.post(url, headers=headers, data=mp3_bytes, timeout=180)
     if r.status_code >= 400:
         try:
             body = r.json()
@@ -247,7 +248,7 @@ def upload_audio_asset_from_url(audio_url: str, filename: Optional[str] = None,
     if not HEYGEN_API_KEY:
         return "asset_stub_audio"
 
-    dr = requests.get(audio_url, stream=True, timeout=timeout)
+    dr = transport.get(audio_url, stream=True, timeout=timeout)
     dr.raise_for_status()
     chunks = []
     for chunk in dr.iter_content(8192):
@@ -402,7 +403,7 @@ def get_video_status(video_id: str) -> dict:
     if not HEYGEN_API_KEY:
         return {"status": "completed", "video_url": "https://example.com/video/avatar.mp4"}
     url = f"{API_BASE}/v1/video_status.get"
-    r = requests.get(url, headers=_headers(False), params={"video_id": video_id}, timeout=60)
+    r = transport.get(url, headers=_headers(False), params={"video_id": video_id}, timeout=60)
     r.raise_for_status()
     return r.json().get("data") or {}
 
@@ -1,7 +1,8 @@
-import os, io, json, requests
+import os, io, json
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload
+from core.adapters import transport
 
 def _drive():
     sa_json = os.getenv("GDRIVE_SERVICE_ACCOUNT_JSON","")
@@ -13,7 +14,7 @@ def _drive():
 
 def upload_from_url(url: str, file_name: str, folder_id: str):
     dr = _drive()
-    r = requests.get(url, stream=True, timeout=300)
+    r = transport.get(url, stream=True, timeout=300)
     r.raise_for_status()
     bio = io.BytesIO(r.content)
     media = MediaIoBaseUpload(bio, mimetype="video/mp4", resumable=True)
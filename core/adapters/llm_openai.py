@@ -1,7 +1,32 @@
-import os, json, requests
+import os, json, time, asyncio, logging, threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import httpx, requests
+
+from core.adapters import transport
+from core.ratelimit import openai_limiter, estimate_tokens, parse_reset
+from core.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL   = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+CHAT_URL = "https://api.openai.com/v1/chat/completions"
+# Batch API (files + batches); point at core.fake_openai_batch to run batch jobs offline
+BATCH_BASE_URL = os.getenv("OPENAI_BATCH_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+RATE_LIMIT_RETRIES = int(os.getenv("OPENAI_429_RETRIES", "5"))  # 429s are waited out here, not retried by Celery
+
+# Hedging (OPENAI_HEDGE_ENABLED=1, then per call with chat(hedge=True)): a call still
+# running after the HEDGE_PERCENTILE of recent latencies gets a duplicate; first answer wins.
+HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "0") in ("1", "true", "True")
+HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("OPENAI_HEDGE_DEFAULT_DELAY", "8"))  # until enough samples
+HEDGE_MAX_RATIO = float(os.getenv("OPENAI_HEDGE_MAX_RATIO", "0.1"))  # duplicates per hedge-eligible call
+HEDGE_MAX_INFLIGHT = int(os.getenv("OPENAI_HEDGE_MAX_INFLIGHT", "4"))  # unfinished hedged pairs per process
+LATENCY_KEY = "hmva:llm:latency"
+HEDGE_KEY = "hmva:llm:hedge"
+LATENCY_SAMPLES = 200
 
 # (Optional) keep a tiny allowlist to avoid typos in env
 _ALLOWED_MODELS = {
@@ -13,10 +38,18 @@ _ALLOWED_MODELS = {
 def _pick_model(name: str) -> str:
     return name if name in _ALLOWED_MODELS else "gpt-4o-mini"
 
-def chat(system: str, user: str, temperature: float = 0.5) -> str:
+def current_model() -> str:
+    """The model chat() will actually call (after the allowlist)."""
+    return _pick_model(OPENAI_MODEL)
+
+def chat(system: str, user: str, temperature: float = 0.5, response_format: dict | None = None,
+         hedge: bool = False) -> str:
     """
-    Returns the assistant message content (expected JSON string because of response_format).
+    Returns the assistant message content (expected JSON string because of response_format;
+    pass a json_schema response_format, see core.schemas, to constrain its shape).
+    hedge=True (interactive callers) races a duplicate request against a slow one.
     Raises a RuntimeError that includes the API's error message on 4xx/5xx.
+    Every call first waits on the shared OpenAI rate limiter (core.ratelimit).
     """
     # Local fallback when no key present (your original stub)
     # if not OPENAI_API_KEY:
@@ -36,29 +69,322 @@ def chat(system: str, user: str, temperature: float = 0.5) -> str:
     #         )
     #     })
 
+    payload = _payload(system, user, temperature, response_format)
+    est_tokens = estimate_tokens(system, user)
+    if hedge and HEDGE_ENABLED:
+        return _hedged(payload, est_tokens)
+    return _post(payload, est_tokens)
+
+
+def _post(payload: dict, est_tokens: int) -> str:
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        # Wait for cluster-wide capacity instead of failing into a Celery retry storm
+        openai_limiter.acquire(est_tokens)
+        try:
+            r = transport.post(CHAT_URL, headers=_auth_headers(), json=payload, timeout=120)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Network error calling OpenAI: {e}") from e
+
+        openai_limiter.observe(r.headers)
+        if r.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        openai_limiter.pause(_retry_wait(r.headers, attempt))
+
+    return _content(r, est_tokens)
+
+
+# ---------------------------------------------------------------- hedging
+# One worker per web thread for primaries, plus one per hedged pair that may still be
+# running, so a primary never queues behind other requests (which would inflate the
+# latencies hedge_delay() is computed from and fire backups for queueing, not the provider).
+_pool = ThreadPoolExecutor(max_workers=transport.WEB_THREADS + HEDGE_MAX_INFLIGHT, thread_name_prefix="llm-hedge")
+_hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_INFLIGHT)
+_local_latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+_local_counts = {"calls": 0, "hedged": 0, "hedge_won": 0, "hedge_skipped": 0}
+_counts_lock = threading.Lock()
+
+
+def _record_latency(seconds: float) -> None:
+    _local_latencies.append(seconds)
+    try:
+        r = get_redis()
+        if r is not None:
+            r.pipeline().lpush(LATENCY_KEY, round(seconds, 3)).ltrim(LATENCY_KEY, 0, LATENCY_SAMPLES - 1).execute()
+    except Exception:
+        logger.debug("llm latency samples unavailable", exc_info=True)
+
+
+def _timed(payload: dict, est_tokens: int) -> str:
+    # only hedge-eligible calls are sampled: batch prompts would skew the percentile
+    start = time.monotonic()
+    content = _post(payload, est_tokens)
+    _record_latency(time.monotonic() - start)
+    return content
+
+
+def hedge_delay() -> float:
+    """Seconds to wait before hedging: HEDGE_PERCENTILE of recent successful calls."""
+    samples = list(_local_latencies)
+    try:
+        r = get_redis()
+        if r is not None:
+            samples = [float(v) for v in r.lrange(LATENCY_KEY, 0, -1)] or samples
+    except Exception:
+        logger.debug("llm latency samples unavailable", exc_info=True)
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    samples.sort()
+    return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))]
+
+
+def _count(field: str) -> dict:
+    """Increment a hedge counter; returns the current counts (cluster-wide when Redis is up)."""
+    try:
+        r = get_redis()
+        if r is not None:
+            pipe = r.pipeline()
+            pipe.hincrby(HEDGE_KEY, field, 1)
+            pipe.hgetall(HEDGE_KEY)
+            return {k.decode(): int(v) for k, v in pipe.execute()[1].items()}
+    except Exception:
+        logger.debug("hedge stats unavailable", exc_info=True)
+    with _counts_lock:
+        _local_counts[field] += 1
+        return dict(_local_counts)
+
+
+def hedge_stats() -> dict:
+    """{"calls", "hedged", "hedge_won", "hedge_skipped"} plus how often hedges fire and win."""
+    counts = dict(_local_counts)
+    try:
+        r = get_redis()
+        if r is not None:
+            counts.update({k.decode(): int(v) for k, v in r.hgetall(HEDGE_KEY).items()})
+    except Exception:
+        logger.debug("hedge stats unavailable", exc_info=True)
+    calls, hedged = counts.get("calls", 0), counts.get("hedged", 0)
+    return {
+        **counts,
+        "hedge_rate": round(hedged / calls, 4) if calls else 0.0,
+        "win_rate": round(counts.get("hedge_won", 0) / hedged, 4) if hedged else 0.0,
+    }
+
+
+def _hedged(payload: dict, est_tokens: int) -> str:
+    """
+    _post, plus one duplicate request if the first hasn't answered within hedge_delay().
+    Duplicates are capped at HEDGE_MAX_RATIO of hedge-eligible calls and at
+    HEDGE_MAX_INFLIGHT pairs in this process (no backup when the slots are taken);
+    the slower request is left to finish in the background and its answer discarded.
+    """
+    counts = _count("calls")
+    primary = _pool.submit(_timed, payload, est_tokens)
+    done, _ = wait([primary], timeout=hedge_delay())
+    if done or counts.get("hedged", 0) >= HEDGE_MAX_RATIO * counts.get("calls", 0):
+        return primary.result()
+    if not _hedge_slots.acquire(blocking=False):
+        _count("hedge_skipped")
+        return primary.result()
+
+    _count("hedged")
+    backup = _pool.submit(_timed, payload, est_tokens)
+    # the slot is held until both requests are finished, the loser included
+    backup.add_done_callback(lambda _: primary.add_done_callback(lambda _: _hedge_slots.release()))
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                if fut is backup:
+                    _count("hedge_won")
+                    logger.info("OpenAI hedge request answered first")
+                return fut.result()
+            error = fut.exception()
+    raise error
+
+
+async def achat(system: str, user: str, temperature: float = 0.5, *, client, response_format: dict | None = None) -> str:
+    """
+    Async twin of chat() for the asyncio batch executor.
+    `client` is a shared httpx.AsyncClient; same limiter, errors and return value as chat().
+    """
+    payload = _payload(system, user, temperature, response_format)
+    est_tokens = estimate_tokens(system, user)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        # the limiter blocks on Redis; keep it off the event loop
+        await asyncio.to_thread(openai_limiter.acquire, est_tokens)
+        try:
+            r = await client.post(CHAT_URL, headers=_auth_headers(), json=payload)
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Network error calling OpenAI: {e}") from e
+
+        openai_limiter.observe(r.headers)
+        if r.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        openai_limiter.pause(_retry_wait(r.headers, attempt))
+
+    return _content(r, est_tokens)
+
+
+def chat_stream(system: str, user: str, temperature: float = 0.5):
+    """
+    Streaming chat() for plain-text answers: yields content deltas as the model
+    produces them (server-sent events, stream=True). Same limiter and error contract
+    as chat(); tokens are reconciled from the final usage chunk.
+    """
     payload = {
-        "model": _pick_model(OPENAI_MODEL),
+        "model": current_model(),
         "temperature": float(temperature),
         "messages": [
             {"role": "system", "content": system},
             {"role": "user",   "content": user},
         ],
-        "response_format": {"type": "json_object"},
+        "stream": True,
+        "stream_options": {"include_usage": True},
     }
+    est_tokens = estimate_tokens(system, user)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        openai_limiter.acquire(est_tokens)
+        try:
+            r = transport.post(CHAT_URL, headers=_auth_headers(), json=payload, stream=True, timeout=120)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Network error calling OpenAI: {e}") from e
+
+        openai_limiter.observe(r.headers)
+        if r.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        r.close()
+        openai_limiter.pause(_retry_wait(r.headers, attempt))
+
+    if r.status_code >= 400:
+        _content(r, est_tokens)  # raises with the API's message
 
+    used = 0
     try:
-        r = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=120,
-        )
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            used = (chunk.get("usage") or {}).get("total_tokens") or used
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+    except requests.RequestException as e:
+        raise RuntimeError(f"Network error reading the OpenAI stream: {e}") from e
+    finally:
+        r.close()
+        openai_limiter.reconcile(est_tokens, used)
+
+
+# ---------------------------------------------------------------- Batch API
+BATCH_TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request(custom_id: str, system: str, user: str, temperature: float = 0.5,
+                  response_format: dict | None = None) -> dict:
+    """One line of a batch input file: the same body chat() would POST."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": _payload(system, user, temperature, response_format),
+    }
+
+
+def _batch_call(method: str, path: str, **kwargs):
+    try:
+        r = transport.request(method, f"{BATCH_BASE_URL}{path}",
+                              headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}, timeout=(10, 300), **kwargs)
     except requests.RequestException as e:
         raise RuntimeError(f"Network error calling OpenAI: {e}") from e
+    if r.status_code >= 400:
+        raise RuntimeError(f"OpenAI API error {r.status_code}: {r.text[:500]}")
+    return r
+
+
+def upload_batch_file(fh, name: str = "batch.jsonl") -> str:
+    """Upload a JSONL input file (an open binary file); returns the file id."""
+    r = _batch_call("POST", "/files", files={"file": (name, fh, "application/jsonl")}, data={"purpose": "batch"})
+    return r.json()["id"]
+
+
+def create_batch(input_file_id: str, metadata: dict | None = None) -> dict:
+    return _batch_call("POST", "/batches", json={
+        "input_file_id": input_file_id,
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h",
+        "metadata": metadata or {},
+    }).json()
+
+
+def retrieve_batch(batch_id: str) -> dict:
+    return _batch_call("GET", f"/batches/{batch_id}").json()
+
+
+def iter_batch_results(file_id: str):
+    """
+    Stream an output/error file: yields (custom_id, content or None). None means the
+    request failed (error line or non-200 response).
+    """
+    r = _batch_call("GET", f"/files/{file_id}/content", stream=True)
+    try:
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            resp = rec.get("response") or {}
+            content = None
+            if not rec.get("error") and resp.get("status_code") == 200:
+                try:
+                    content = (resp["body"]["choices"][0]["message"]["content"] or "").strip()
+                except (KeyError, IndexError, TypeError):
+                    content = None
+            yield rec.get("custom_id"), content
+    finally:
+        r.close()
+
+
+def _payload(system: str, user: str, temperature: float, response_format: dict | None = None) -> dict:
+    return {
+        "model": current_model(),
+        "temperature": float(temperature),
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user",   "content": user},
+        ],
+        "response_format": response_format or {"type": "json_object"},
+    }
+
+
+def _auth_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+def _retry_wait(headers, attempt: int) -> float:
+    return (
+        parse_reset(headers.get("retry-after"))
+        or max(parse_reset(headers.get("x-ratelimit-reset-requests")),
+               parse_reset(headers.get("x-ratelimit-reset-tokens")))
+        or 2.0 ** attempt
+    )
+
 
+def _content(r, est_tokens: int) -> str:
+    """Works for both requests and httpx responses."""
     # If it fails, show the API's message so you know exactly what's wrong
     if r.status_code >= 400:
         try:
@@ -75,4 +401,5 @@ def chat(system: str, user: str, temperature: float = 0.5) -> str:
     except (KeyError, IndexError, TypeError):
         raise RuntimeError(f"Unexpected OpenAI response shape: {json.dumps(data)[:500]}")
 
+    openai_limiter.reconcile(est_tokens, (data.get("usage") or {}).get("total_tokens") or 0)
     return content
@@ -0,0 +1,145 @@
+# core/adapters/transport.py
+"""
+Shared HTTP transport for vendor adapters.
+
+One keep-alive requests.Session per host (so TLS handshakes are paid once per
+process, not once per call), a common timeout/retry policy and per-host latency
+stats. Celery calls init_pools() in worker_process_init so forked children never
+share sockets inherited from the parent.
+"""
+from __future__ import annotations
+
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+# gunicorn --threads: a web process can have this many requests on one host at once,
+# plus hedged duplicates (llm_openai), so the per-host pool must keep that many sockets.
+# Sockets are only opened on demand, so a prefork worker child still uses one or two.
+WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", str(2 * WEB_THREADS)))
+RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+
+Timeout = Union[None, float, Tuple[float, float]]
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_stats: Dict[str, Dict[str, float]] = {}
+_pool_maxsize = POOL_MAXSIZE
+
+
+def _retry_policy() -> Retry:
+    # Connect failures are always safe to retry (nothing was sent).
+    # Status retries only for idempotent methods; POST bodies are never replayed here.
+    return Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=0,
+        status=RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def _new_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_maxsize, max_retries=_retry_policy())
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def init_pools(pool_maxsize: Optional[int] = None) -> None:
+    """
+    Drop every pooled connection and start fresh. Call once per process after fork;
+    pool_maxsize defaults to HTTP_POOL_MAXSIZE (sized for the web process; a prefork
+    child runs one task at a time and never fills it).
+    """
+    global _pool_maxsize
+    with _lock:
+        for s in _sessions.values():
+            try:
+                s.close()
+            except Exception:
+                pass
+        _sessions.clear()
+        _stats.clear()
+        _pool_maxsize = int(pool_maxsize or POOL_MAXSIZE)
+
+
+def session_for(url: str) -> requests.Session:
+    host = urlsplit(url).netloc.lower()
+    s = _sessions.get(host)
+    if s is None:
+        with _lock:
+            s = _sessions.get(host)
+            if s is None:
+                s = _sessions[host] = _new_session()
+    return s
+
+
+def _timeout(timeout: Timeout) -> Tuple[float, float]:
+    if timeout is None:
+        return (CONNECT_TIMEOUT, READ_TIMEOUT)
+    if isinstance(timeout, tuple):
+        return timeout
+    return (min(CONNECT_TIMEOUT, float(timeout)), float(timeout))
+
+
+def _record(host: str, elapsed_ms: float, ok: bool) -> None:
+    with _lock:
+        st = _stats.setdefault(host, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        st["count"] += 1
+        st["total_ms"] += elapsed_ms
+        st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        if not ok:
+            st["errors"] += 1
+
+
+def host_stats() -> Dict[str, Dict[str, float]]:
+    """Per-host {count, errors, avg_ms, max_ms} for this process."""
+    with _lock:
+        return {
+            host: {
+                "count": st["count"],
+                "errors": st["errors"],
+                "avg_ms": round(st["total_ms"] / st["count"], 1) if st["count"] else 0.0,
+                "max_ms": round(st["max_ms"], 1),
+            }
+            for host, st in _stats.items()
+        }
+
+
+def request(method: str, url: str, *, timeout: Timeout = None, **kwargs) -> requests.Response:
+    """
+    Same contract as requests.request (returns the Response, raises requests exceptions),
+    but on the pooled per-host session. A bare number for timeout is the read timeout.
+    """
+    host = urlsplit(url).netloc.lower()
+    start = time.perf_counter()
+    ok = False
+    try:
+        r = session_for(url).request(method, url, timeout=_timeout(timeout), **kwargs)
+        ok = r.status_code < 500
+        return r
+    finally:
+        _record(host, (time.perf_counter() - start) * 1000.0, ok)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -1,8 +1,10 @@
 # core/adapters/tts_elevenlabs.py
 from __future__ import annotations
-import os, requests
+import os
 from typing import Optional, Dict, Any
 
+from core.adapters import transport
+
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
 
 DEFAULT_VOICE_ID = os.getenv("ELEVENLABS_DEFAULT_VOICE_ID", "EXAVITQu4vr4xnSDxMaL")  # public sample voice
@@ -50,7 +52,7 @@ def synthesize_bytes(
             "use_speaker_boost": use_speaker_boost,
         },
     }
-    r = requests.post(url, headers=_headers(), json=payload, timeout=180)
+    r = transport.post(url, headers=_headers(), json=payload, timeout=180)
     if r.status_code >= 400:
         try:
             body = r.json()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Brand, AvatarProfile, Icon, JobRun, Template, PublishTarget, ScriptRequest
+from .models import Brand, AvatarProfile, Icon, JobRun, LLMResponse, Template, PublishTarget, ScriptRequest
 
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
@@ -41,3 +41,10 @@ class JobRunAdmin(admin.ModelAdmin):
     search_fields = ("job_id", "mode", "state")
     list_filter = ("state",)
     ordering = ("created_at",)
+
+@admin.register(LLMResponse)
+class LLMResponseAdmin(admin.ModelAdmin):
+    list_display = ("prompt_excerpt", "model", "temperature", "hit_count", "last_used_at", "created_at")
+    search_fields = ("key", "prompt_excerpt")
+    list_filter = ("model",)
+    ordering = ("-last_used_at",)
@@ -0,0 +1,129 @@
+# core/batching.py
+"""
+Adaptive batch sizing for paragraph jobs.
+
+save_batch_task reports every batch (rows, failed rows, seconds its header tasks spent
+executing, so time spent waiting on the queue does not count).
+The reports are kept as moving averages per job, plus cluster-wide ones used until the
+job has its own. AdaptiveBatchSizer turns them, together with the io-queue backlog,
+into the size of the next batch: batches should take about TARGET_SECONDS, shrink when
+rows start failing, and grow when save tasks are piling up on the io queue.
+"""
+from __future__ import annotations
+
+import os
+import logging
+from typing import Dict, List, Optional
+
+from core.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+MIN_BATCH = int(os.getenv("ADAPTIVE_BATCH_MIN", "5"))
+MAX_BATCH = int(os.getenv("ADAPTIVE_BATCH_MAX", "200"))
+TARGET_SECONDS = float(os.getenv("ADAPTIVE_BATCH_TARGET_SECONDS", "60"))
+IO_BACKLOG_HIGH = int(os.getenv("ADAPTIVE_IO_BACKLOG_HIGH", "200"))
+ERROR_RATE_HIGH = 0.2
+ALPHA = 0.3  # weight of the newest batch in the moving averages
+
+GLOBAL_KEY = "hmva:batching:stats"
+
+
+# KEYS: stats hashes to update ; ARGV: alpha, row seconds, error rate, ttl seconds
+# One script, so concurrent saves cannot overwrite each other's update.
+_RECORD_LUA = """
+local alpha = tonumber(ARGV[1])
+for _, key in ipairs(KEYS) do
+  local cur = redis.call('HMGET', key, 'row_seconds', 'error_rate', 'samples')
+  local samples = tonumber(cur[3]) or 0
+  local rs = tonumber(ARGV[2])
+  local er = tonumber(ARGV[3])
+  if samples > 0 then
+    rs = (1 - alpha) * tonumber(cur[1]) + alpha * rs
+    er = (1 - alpha) * tonumber(cur[2]) + alpha * er
+  end
+  redis.call('HSET', key, 'row_seconds', tostring(rs), 'error_rate', tostring(er), 'samples', samples + 1)
+  redis.call('EXPIRE', key, tonumber(ARGV[4]))
+end
+return 1
+"""
+
+
+def _job_key(job_id) -> str:
+    return f"hmva:batching:{job_id}"
+
+
+def record_batch(job_id, rows: int, failed: int, seconds: float) -> None:
+    """Fold one finished batch (`seconds` of execution) into the job's and the cluster's moving averages."""
+    r = get_redis()
+    if r is None or rows <= 0 or seconds <= 0:
+        return
+    try:
+        r.register_script(_RECORD_LUA)(
+            keys=[_job_key(job_id), GLOBAL_KEY],
+            args=[ALPHA, seconds / rows, failed / rows, 2 * 24 * 3600],
+        )
+    except Exception:
+        logger.debug("batch stats unavailable", exc_info=True)
+
+
+def _stats(job_id) -> Optional[Dict[str, float]]:
+    r = get_redis()
+    if r is None:
+        return None
+    try:
+        for key in (_job_key(job_id), GLOBAL_KEY):
+            cur = {k.decode(): float(v) for k, v in r.hgetall(key).items()}
+            if cur.get("samples"):
+                return cur
+    except Exception:
+        logger.debug("batch stats unavailable", exc_info=True)
+    return None
+
+
+def io_backlog(queue: str = "io") -> int:
+    """Messages waiting on a Celery queue (the Redis broker keeps each queue as a list)."""
+    r = get_redis()
+    if r is None:
+        return 0
+    try:
+        return int(r.llen(queue))
+    except Exception:
+        return 0
+
+
+class AdaptiveBatchSizer:
+    """Picks each next batch size; `history` is [[batch_no, size], ...] at every change."""
+
+    def __init__(self, job_id, initial: int, min_size: int = MIN_BATCH, max_size: int = MAX_BATCH,
+                 history: Optional[List[List[int]]] = None):
+        self.job_id = job_id
+        self.min_size = min_size
+        self.max_size = max_size
+        # continue from a stored history when sizing is picked up by another process
+        self.history: List[List[int]] = [list(h) for h in (history or [])]
+        self.size = self._clamp(self.history[-1][1] if self.history else initial)
+
+    def _clamp(self, n: float) -> int:
+        return max(self.min_size, min(self.max_size, int(round(n))))
+
+    def next_size(self, batch_no: int) -> int:
+        target = float(self.size)
+        stats = _stats(self.job_id)
+        if stats:
+            if stats["row_seconds"] > 0:
+                target = TARGET_SECONDS / stats["row_seconds"]
+            if stats["error_rate"] > ERROR_RATE_HIGH:
+                target = min(target, self.size * 0.5)
+        if io_backlog() > IO_BACKLOG_HIGH:
+            # saves are the bottleneck: fewer, larger batches
+            target = max(target, self.size * 1.5)
+
+        # bound the target (at most x2 / half the current size, within min..max), then
+        # move halfway towards it, so one odd batch (e.g. all fast rows) can't swing the size
+        target = max(self.min_size, self.size / 2, min(target, self.size * 2, self.max_size))
+        size = self._clamp((self.size + target) / 2)
+        if size != self.size or not self.history:
+            self.history.append([batch_no, size])
+        self.size = size
+        return size
@@ -0,0 +1,119 @@
+# core/events.py
+"""
+Push channel for job status: publishers write a JSON snapshot to a Redis pub/sub
+channel per job, and the SSE endpoint relays it to the browser.
+
+Thread budget: under gunicorn gthread every open stream holds one request thread for
+up to max_seconds, and the browser reconnects right after. So at most MAX_STREAMS
+streams run per web process (keep it well below --threads); beyond that the endpoint
+answers 503 and the page polls /status/ instead.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterator
+
+from core.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = {"SUCCESS", "FAILURE"}
+MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "6"))  # per web process (see module docstring)
+
+_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+class _StreamSlot:
+    """
+    Streaming body that gives its slot back when Django closes the response
+    (stream finished, failed or client gone), even if it was never iterated.
+    """
+
+    def __init__(self, body: Iterator[str]):
+        self._body = body
+        self._held = True
+
+    def __iter__(self):
+        return self._body
+
+    def close(self) -> None:
+        if self._held:
+            self._held = False
+            _streams.release()
+            self._body.close()
+
+
+def open_stream(body: Iterator[str]):
+    """Claim a stream slot for `body`; None when this process already runs MAX_STREAMS."""
+    if not _streams.acquire(blocking=False):
+        return None
+    return _StreamSlot(body)
+
+
+def job_channel(job_id) -> str:
+    return f"hmva:jobs:{job_id}"
+
+
+def publish(job_id, payload: Dict) -> None:
+    """Fire-and-forget; status pushes must never break the task that triggered them."""
+    try:
+        r = get_redis()
+        if r is not None:
+            r.publish(job_channel(job_id), json.dumps(payload, default=str))
+    except Exception:
+        logger.debug("job event publish failed", exc_info=True)
+
+
+def _sse(payload: Dict) -> str:
+    return f"data: {json.dumps(payload, default=str)}\n\n"
+
+
+def stream_job_events(
+    job_id,
+    snapshot: Callable[[], Dict],
+    max_seconds: int = 300,
+    heartbeat: int = 15,
+) -> Iterator[str]:
+    """
+    SSE body: the current snapshot first, then every published change until the job
+    is terminal or max_seconds pass (EventSource reconnects on its own).
+    Subscribes before taking the snapshot so nothing published in between is lost.
+    """
+    yield "retry: 2000\n\n"
+    r = get_redis()
+    if r is None:
+        yield _sse(snapshot())
+        return
+
+    ps = r.pubsub(ignore_subscribe_messages=True)
+    try:
+        ps.subscribe(job_channel(job_id))
+        first = snapshot()
+        yield _sse(first)
+        if first.get("state") in TERMINAL:
+            return
+
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            msg = ps.get_message(timeout=heartbeat)
+            if not msg or msg.get("type") != "message":
+                yield ": keepalive\n\n"
+                continue
+            try:
+                payload = json.loads(msg["data"])
+            except (TypeError, ValueError):
+                continue
+            yield _sse(payload)
+            if payload.get("state") in TERMINAL:
+                return
+    except Exception:
+        logger.warning(f"job event stream for {job_id} ended early", exc_info=True)
+    finally:
+        try:
+            ps.close()
+        except Exception:
+            pass
@@ -0,0 +1,124 @@
+# core/export.py
+"""
+Streaming exports of a job's saved rows (csv / jsonl / parquet), generated straight
+from the JobRow index in row order. Nothing is materialised: rows are read with a
+server-side iterator and each chunk is encoded (and optionally gzipped) as it goes.
+"""
+from __future__ import annotations
+
+import io
+import csv
+import json
+import zlib
+import importlib.util
+from typing import Iterable, Iterator
+
+from core.jobs import FINISHED_STATES, ROW_FIELDS
+from core.models import JobRow
+
+EXPORT_FIELDS = ["row", *ROW_FIELDS, "state"]
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+CHUNK_ROWS = 2000  # DB fetch size and parquet row-group size
+
+
+def _rows(job_id) -> Iterator[dict]:
+    # rows of a running job that are still queued have no output yet
+    qs = JobRow.objects.filter(job_id=job_id, state__in=FINISHED_STATES).order_by("row").values(*EXPORT_FIELDS)
+    return qs.iterator(chunk_size=CHUNK_ROWS)
+
+
+def _csv(rows: Iterable[dict]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    n = 0
+    for rec in rows:
+        writer.writerow(rec)
+        n += 1
+        if n % 200 == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _jsonl(rows: Iterable[dict]) -> Iterator[bytes]:
+    chunk = []
+    for rec in rows:
+        chunk.append(json.dumps(rec, ensure_ascii=False))
+        if len(chunk) >= 200:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink for pyarrow that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _parquet(rows: Iterable[dict]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("row", pa.int64())] + [(f, pa.string()) for f in EXPORT_FIELDS[1:]])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def flush(batch):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        return sink.drain()
+
+    batch = []
+    for rec in rows:
+        batch.append(rec)
+        if len(batch) >= CHUNK_ROWS:
+            yield flush(batch)
+            batch = []
+    if batch:
+        yield flush(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_stream(job_id, fmt: str) -> Iterator[bytes]:
+    encode = {"csv": _csv, "jsonl": _jsonl, "parquet": _parquet}[fmt]
+    return encode(_rows(job_id))
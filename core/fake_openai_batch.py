@@ -0,0 +1,150 @@
+# core/fake_openai_batch.py
+"""
+Local stand-in for the OpenAI Files + Batches endpoints, so engine="batch" jobs can
+run end to end offline and without spend:
+
+    python -m core.fake_openai_batch --port 8765 --delay 5
+    OPENAI_BATCH_BASE_URL=http://localhost:8765/v1   (web + worker + beat)
+
+A batch completes `delay` seconds after it is created (checked on retrieve). Every
+request is answered with a deterministic paragraph_ssml JSON built from the icon in
+its prompt; --fail-every N turns every Nth request into an error line so the
+FAILED-row / resume path can be exercised too. Standard library only.
+"""
+import re
+import json
+import time
+import uuid
+import argparse
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+_ICON = re.compile(r"paragraph \([^)]*\) about (.+?)\.\s*$", re.M)
+
+_lock = threading.Lock()
+_files = {}  # file id -> bytes
+_batches = {}  # batch id -> batch object (+ "_ready_at")
+
+
+def _answer(body: dict) -> str:
+    prompt = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+    m = _ICON.search(prompt)
+    icon = m.group(1).strip() if m else "this icon"
+    paragraph = (
+        f"{icon} wears quiet confidence. A soft wool overshirt in muted olive meets straight selvedge denim "
+        f"and worn leather boots on a grey city morning. Try it with a plain white tee. The look stays calm, "
+        f"considered and easy to live in."
+    )
+    ssml = f'<speak><prosody rate="medium">{escape(paragraph)}</prosody><mark name="END"/></speak>'
+    return json.dumps({"paragraph": paragraph, "ssml": ssml})
+
+
+def _run(batch: dict, fail_every: int) -> None:
+    out, err = [], []
+    lines = [ln for ln in _files[batch["input_file_id"]].decode("utf-8").splitlines() if ln.strip()]
+    for i, ln in enumerate(lines, start=1):
+        req = json.loads(ln)
+        rid = f"batch_req_{uuid.uuid4().hex[:12]}"
+        if fail_every and i % fail_every == 0:
+            err.append({"id": rid, "custom_id": req["custom_id"], "response": None,
+                        "error": {"code": "server_error", "message": "fake failure"}})
+            continue
+        out.append({"id": rid, "custom_id": req["custom_id"], "error": None, "response": {
+            "status_code": 200, "request_id": rid,
+            "body": {"object": "chat.completion", "model": req["body"].get("model"),
+                     "choices": [{"index": 0, "message": {"role": "assistant", "content": _answer(req["body"])},
+                                  "finish_reason": "stop"}]},
+        }})
+    for key, recs in (("output_file_id", out), ("error_file_id", err)):
+        if recs:
+            fid = f"file-{uuid.uuid4().hex[:24]}"
+            _files[fid] = "".join(json.dumps(r) + "\n" for r in recs).encode("utf-8")
+            batch[key] = fid
+    batch.update(status="completed", completed_at=int(time.time()),
+                 request_counts={"total": len(lines), "completed": len(out), "failed": len(err)})
+
+
+class Handler(BaseHTTPRequestHandler):
+    delay = 5.0
+    fail_every = 0
+
+    def _json(self, code: int, obj) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        if self.path == "/v1/files":
+            msg = BytesParser(policy=policy.HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + self._body())
+            parts = {p.get_param("name", header="content-disposition"): p for p in msg.iter_parts()}
+            if "file" not in parts:
+                return self._json(400, {"error": {"message": "file is required"}})
+            fid = f"file-{uuid.uuid4().hex[:24]}"
+            data = parts["file"].get_payload(decode=True) or b""
+            with _lock:
+                _files[fid] = data
+            return self._json(200, {"id": fid, "object": "file", "bytes": len(data), "purpose": "batch"})
+        if self.path == "/v1/batches":
+            req = json.loads(self._body() or b"{}")
+            if req.get("input_file_id") not in _files:
+                return self._json(400, {"error": {"message": "unknown input_file_id"}})
+            bid = f"batch_{uuid.uuid4().hex[:24]}"
+            batch = {"id": bid, "object": "batch", "endpoint": req.get("endpoint"), "status": "validating",
+                     "input_file_id": req["input_file_id"], "output_file_id": None, "error_file_id": None,
+                     "created_at": int(time.time()), "metadata": req.get("metadata") or {},
+                     "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+            with _lock:
+                _batches[bid] = dict(batch, _ready_at=time.time() + self.delay)
+            return self._json(200, batch)
+        self._json(404, {"error": {"message": f"no route for POST {self.path}"}})
+
+    def do_GET(self):
+        m = re.fullmatch(r"/v1/batches/([\w-]+)", self.path)
+        if m:
+            with _lock:
+                batch = _batches.get(m.group(1))
+                if batch is None:
+                    return self._json(404, {"error": {"message": "no such batch"}})
+                if batch["status"] != "completed":
+                    batch["status"] = "in_progress"
+                    if time.time() >= batch["_ready_at"]:
+                        _run(batch, self.fail_every)
+                out = {k: v for k, v in batch.items() if not k.startswith("_")}
+            return self._json(200, out)
+        m = re.fullmatch(r"/v1/files/([\w-]+)/content", self.path)
+        if m and m.group(1) in _files:
+            data = _files[m.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self._json(404, {"error": {"message": f"no route for GET {self.path}"}})
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Fake OpenAI Batch API for offline engine='batch' runs")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=5.0, help="seconds until a batch completes")
+    ap.add_argument("--fail-every", type=int, default=0, help="fail every Nth request (0 = never)")
+    args = ap.parse_args(argv)
+    Handler.delay, Handler.fail_every = args.delay, args.fail_every
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Fake OpenAI batch API on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
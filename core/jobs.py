@@ -1,9 +1,17 @@
 # core/jobs.py
+import uuid
+from datetime import timedelta
 from typing import Optional
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import F, Q
 from django.core.files.storage import default_storage
-from .models import JobRun
+from . import events
+from .batching import AdaptiveBatchSizer
+from .models import JobRun, JobRow
+
+ROW_FIELDS = ("icon", "category", "notes", "paragraph", "ssml")
+FINISHED_STATES = ("DONE", "FAILED")  # rows with a saved outcome; QUEUED/PENDING are still in the works
 
 
 def job_get_or_create(job_id, **kwargs) -> JobRun:
@@ -30,8 +38,327 @@ def job_set_state(job_id, state: str, error: str = "", download_url: str = "", r
     if results_path:
         update["results_path"] = results_path
     JobRun.objects.filter(job_id=job_id).update(**update)
+    job_publish(job_id)
 
 
 def job_touch(job_id, **kwargs) -> None:
     kwargs["updated_at"] = timezone.now()
     JobRun.objects.filter(job_id=job_id).update(**kwargs)
+
+
+def job_mark_rows(job_id, results) -> tuple:
+    """
+    Checkpoint a saved batch: DONE when a paragraph came back, FAILED otherwise.
+    The row payload is stored alongside, so JobRow doubles as the row-indexed results store.
+    Returns (done_delta, failed_delta) against the rows' previous states, so a
+    re-delivered batch or a resumed row never counts twice.
+    """
+    now = timezone.now()
+    by_row = {int(r["row"]): r for r in results if r.get("row")}
+    if not by_row:
+        return 0, 0
+    states = {
+        row: ("DONE" if (r.get("paragraph") or "").strip() else "FAILED")
+        for row, r in by_row.items()
+    }
+    before = dict(JobRow.objects.filter(job_id=job_id, row__in=list(states)).values_list("row", "state"))
+    JobRow.objects.bulk_create(
+        [
+            JobRow(
+                job_id=job_id, row=row, state=states[row], updated_at=now,
+                **{f: (r.get(f) or "") for f in ROW_FIELDS},
+            )
+            for row, r in by_row.items()
+        ],
+        update_conflicts=True, unique_fields=["job", "row"],
+        update_fields=["state", "updated_at", *ROW_FIELDS],
+    )
+    done = failed = 0
+    for row, st in states.items():
+        prev = before.get(row)
+        if prev == st:
+            continue
+        done += (st == "DONE") - (prev == "DONE")
+        failed += (st == "FAILED") - (prev == "FAILED")
+    return done, failed
+
+
+def row_fingerprint(row: dict) -> str:
+    """Identity of a row's LLM input: icon, category and notes, whitespace/case-normalised."""
+    return "\x1f".join(" ".join((row.get(f) or "").split()).casefold() for f in ("icon", "category", "notes"))
+
+
+def job_register_duplicates(job_id, dups) -> None:
+    """
+    Record rows that repeat an earlier row's input as PENDING with dup_of set,
+    so they are filled from that row's result instead of being generated again.
+    `dups` is an iterable of (row_dict, canonical_row).
+    """
+    now = timezone.now()
+    JobRow.objects.bulk_create(
+        [
+            JobRow(
+                job_id=job_id, row=int(r["row"]), state="PENDING", dup_of=int(canon), updated_at=now,
+                **{f: (r.get(f) or "") for f in ("icon", "category", "notes")},
+            )
+            for r, canon in dups
+        ],
+        update_conflicts=True, unique_fields=["job", "row"],
+        update_fields=["dup_of", "icon", "category", "notes", "updated_at"],
+    )
+
+
+def job_fan_out(job_id, results) -> list:
+    """Result dicts for every duplicate of the given rows, carrying the source row's output."""
+    by_row = {int(r["row"]): r for r in results if r.get("row")}
+    if not by_row:
+        return []
+    out = []
+    dups = JobRow.objects.filter(job_id=job_id, dup_of__in=list(by_row)).values_list(
+        "row", "dup_of", "icon", "category", "notes")
+    for row, dup_of, icon, category, notes in dups:
+        src = by_row[dup_of]
+        out.append({
+            "row": row, "icon": icon, "category": category, "notes": notes,
+            "paragraph": src.get("paragraph") or "", "ssml": src.get("ssml") or "",
+        })
+    return out
+
+
+def job_fill_duplicates(job_id) -> list:
+    """
+    Fill duplicates still PENDING whose source row has finished (e.g. the duplicate
+    was registered after its source's batch was saved). Returns the filled rows.
+    """
+    sources = JobRow.objects.filter(job_id=job_id, state="PENDING", dup_of__isnull=False).values_list("dup_of", flat=True)
+    finished = JobRow.objects.filter(job_id=job_id, row__in=sources).exclude(state="PENDING").values("row", *ROW_FIELDS)
+    filled = job_fan_out(job_id, list(finished))
+    if filled:
+        done, failed = job_mark_rows(job_id, filled)
+        job_record_progress(job_id, done, failed)
+    return filled
+
+
+def iter_unsharded_rows(job_id):
+    """
+    Rows, in row order, whose final value may be missing from the batch shards: filled
+    duplicates (never sharded) and FAILED rows (a lost batch may not have written one).
+    Merged over the shards by finalize_job_task, so every sheet row is in the workbook.
+    """
+    qs = (JobRow.objects.filter(job_id=job_id)
+          .filter(Q(dup_of__isnull=False) | Q(state="FAILED")).exclude(state="PENDING")
+          .order_by("row").values("row", *ROW_FIELDS))
+    return qs.iterator(chunk_size=2000)
+
+
+def job_spool_rows(job_id, rows) -> None:
+    """
+    Store ingested rows as QUEUED for the windowed dispatcher (row order = claim order).
+    Rows re-queued by a resume stop counting as failed.
+    """
+    now = timezone.now()
+    nums = [int(r["row"]) for r in rows]
+    was_failed = JobRow.objects.filter(job_id=job_id, row__in=nums, state="FAILED").count()
+    JobRow.objects.bulk_create(
+        [
+            JobRow(
+                job_id=job_id, row=int(r["row"]), state="QUEUED", dup_of=None, updated_at=now,
+                **{f: (r.get(f) or "") for f in ("icon", "category", "notes")},
+            )
+            for r in rows
+        ],
+        update_conflicts=True, unique_fields=["job", "row"],
+        update_fields=["state", "dup_of", "icon", "category", "notes", "updated_at"],
+    )
+    if was_failed:
+        JobRun.objects.filter(job_id=job_id).update(rows_failed=F("rows_failed") - was_failed)
+
+
+def job_claim_batches(job_id, finished: Optional[int] = None, run: Optional[int] = None) -> tuple:
+    """
+    Sliding-window bookkeeping, atomic on the JobRun row: release the slot of batch
+    `finished` of pass `run`, then cut QUEUED rows after the dispatch cursor into new batches until
+    params["window"] batches are in flight (all of them for window=0). While ingestion is still running only
+    full batches are cut. Returns (job, [(batch_no, rows), ...], finalize_id), where
+    finalize_id is returned exactly once: when the job is sealed and nothing is
+    queued or in flight.
+    A batch frees its slot at most once: a redelivered save or a second errback for the
+    same batch (or one from an earlier pass) is ignored instead of draining the window early.
+    """
+    with transaction.atomic():
+        job = JobRun.objects.select_for_update().get(job_id=job_id)
+        p = job.params or {}
+        window = int(p.get("window") or 0)  # 0 = no bound
+        batch_size = int(p.get("batch_size") or 25)
+        sizer = AdaptiveBatchSizer(job_id, batch_size, history=job.batch_sizes) if p.get("adaptive") else None
+
+        inflight, released = job.inflight, list(job.released_batches or [])
+        if finished is not None and run == job.run and finished not in released:
+            released.append(finished)
+            inflight = max(0, inflight - 1)
+        cursor, batch_no = job.dispatch_cursor, job.batches
+        claimed = []
+        while (window <= 0 or inflight < window) and job.dispatch_state in ("INGESTING", "SEALED"):
+            size = sizer.next_size(batch_no + 1) if sizer else batch_size
+            rows = list(
+                JobRow.objects.filter(job_id=job_id, state="QUEUED", row__gt=cursor)
+                .order_by("row").values("row", "icon", "category", "notes")[:size]
+            )
+            if not rows or (len(rows) < size and job.dispatch_state == "INGESTING"):
+                break
+            cursor = rows[-1]["row"]
+            batch_no += 1
+            inflight += 1
+            claimed.append((batch_no, rows))
+
+        finalize_id = None
+        update = {"inflight": inflight, "dispatch_cursor": cursor, "batches": batch_no,
+                  "released_batches": released, "updated_at": timezone.now()}
+        if sizer:
+            update["batch_sizes"] = sizer.history
+        if job.dispatch_state == "SEALED" and inflight == 0:
+            finalize_id = job.handoff_id
+            update["dispatch_state"] = "FINALIZING"
+        JobRun.objects.filter(pk=job.pk).update(**update)
+    return job, claimed, finalize_id
+
+
+def job_settle_queued(job_id, rows) -> tuple:
+    """
+    Settle the rows of a lost batch that were never saved: DONE when a row task already
+    stored a paragraph for them (job_store_outputs), FAILED otherwise.
+    Returns (done, failed).
+    """
+    now = timezone.now()
+    qs = JobRow.objects.filter(job_id=job_id, row__in=list(rows), state="QUEUED")
+    done = qs.exclude(paragraph="").update(state="DONE", updated_at=now)
+    failed = qs.filter(paragraph="").update(state="FAILED", updated_at=now)
+    if done or failed:
+        job_record_progress(job_id, done, failed)
+    return done, failed
+
+
+def job_seal_dispatch(job_id, state: str = "SEALED") -> str:
+    """
+    Ingestion finished: no more rows will be queued. Returns the finalize task id.
+    state="BATCHING" parks the job until its provider batches are back (engine="batch");
+    nothing is claimed until it is moved on to SEALED.
+    """
+    finalize_id = str(uuid.uuid4())
+    JobRun.objects.filter(job_id=job_id).update(
+        dispatch_state=state, handoff_id=finalize_id, updated_at=timezone.now())
+    return finalize_id
+
+
+def job_store_outputs(job_id, results) -> None:
+    """
+    Write generated paragraph/SSML onto the job's rows as soon as a row task finishes.
+    State is left alone: save_batch_task still owns the DONE/FAILED transition and counters.
+    """
+    now = timezone.now()
+    JobRow.objects.bulk_create(
+        [
+            JobRow(job_id=job_id, row=int(r["row"]), state="QUEUED", updated_at=now,
+                   **{f: (r.get(f) or "") for f in ROW_FIELDS})
+            for r in results if r.get("row")
+        ],
+        update_conflicts=True, unique_fields=["job", "row"],
+        update_fields=["paragraph", "ssml", "updated_at"],
+    )
+
+
+def job_load_rows(job_id, rows) -> list:
+    """Stored row payloads for the given row numbers, in row order."""
+    return list(JobRow.objects.filter(job_id=job_id, row__in=list(rows)).order_by("row").values("row", *ROW_FIELDS))
+
+
+def job_result_page(job_id, after: int = 0, limit: int = 200,
+                    category: Optional[str] = None, errors: Optional[bool] = None) -> list:
+    """
+    One page of saved rows with row > after, in row order (keyset pagination on
+    the (job, row) index, so any page costs the same).
+    errors=True -> FAILED rows only, errors=False -> DONE rows only.
+    Only finished rows are returned: rows still queued in a running job (and
+    duplicates waiting for their source row) have no output yet.
+    """
+    qs = JobRow.objects.filter(job_id=job_id, row__gt=after, state__in=FINISHED_STATES)
+    if category is not None:
+        qs = qs.filter(category=category)
+    if errors is not None:
+        qs = qs.filter(state="FAILED" if errors else "DONE")
+    return list(qs.order_by("row").values("row", "state", *ROW_FIELDS)[:limit])
+
+
+PROGRESS_WINDOW = timedelta(minutes=5)
+STALL_AFTER = timedelta(minutes=10)
+
+
+def job_record_progress(job_id, done: int, failed: int) -> None:
+    """Bump the live counters atomically and refresh the rolling rows/minute."""
+    now = timezone.now()
+    JobRun.objects.filter(job_id=job_id).update(
+        rows_done=F("rows_done") + done,
+        rows_failed=F("rows_failed") + failed,
+        last_progress_at=now,
+        updated_at=now,
+    )
+    started = JobRun.objects.filter(job_id=job_id).values_list("started_at", flat=True).first() or now
+    window = min(PROGRESS_WINDOW, max(now - started, timedelta(seconds=30)))
+    recent = JobRow.objects.filter(job_id=job_id, updated_at__gte=now - window, state__in=("DONE", "FAILED")).count()
+    JobRun.objects.filter(job_id=job_id).update(rows_per_minute=round(recent / (window.total_seconds() / 60.0), 2))
+    job_publish(job_id)
+
+
+def job_progress(job: JobRun) -> dict:
+    """rows_total/done/failed, rows_per_minute, dedup ratio, percent, eta_seconds and a stalled flag."""
+    finished = job.rows_done + job.rows_failed
+    deduped = job.rows_deduped
+    remaining = max(job.rows_total - finished, 0)
+    rpm = job.rows_per_minute or 0.0
+    terminal = job.state in ("SUCCESS", "FAILURE")
+    # engine="batch": no rows finish while the provider works; the poller bumps updated_at instead
+    if job.dispatch_state == "BATCHING":
+        last = job.updated_at
+    else:
+        last = job.last_progress_at or job.started_at or job.updated_at
+    stalled = bool(not terminal and job.rows_total and remaining and (timezone.now() - last) > STALL_AFTER)
+    return {
+        "rows_total": job.rows_total,
+        "rows_done": job.rows_done,
+        "rows_failed": job.rows_failed,
+        "percent": round(100.0 * finished / job.rows_total, 1) if job.rows_total else None,
+        "rows_per_minute": rpm,
+        "rows_deduped": deduped,
+        "dedup_ratio": round(deduped / job.rows_total, 3) if job.rows_total else None,
+        "eta_seconds": int(remaining * 60 / rpm) if (rpm and remaining and not terminal and not stalled) else None,
+        "stalled": stalled,
+        "last_progress_at": job.last_progress_at.isoformat() if job.last_progress_at else None,
+    }
+
+
+def job_done_rows(job_id) -> set:
+    """Row numbers already completed for this job (what a resume can skip)."""
+    return set(JobRow.objects.filter(job_id=job_id, state="DONE").values_list("row", flat=True))
+
+
+def job_snapshot(job: JobRun) -> dict:
+    """Same shape as the job_status payload, for the push channel."""
+    out = {
+        "job_id": str(job.job_id),
+        "state": job.state,
+        "mode": job.mode or None,
+        "progress": job_progress(job),
+    }
+    if job.download_url:
+        out["download_url"] = job.download_url
+    if job.results_path:
+        out["results_file"] = job.results_path
+    if job.state == "FAILURE":
+        out["error"] = job.error or "Job failed."
+    return out
+
+
+def job_publish(job_id) -> None:
+    job = JobRun.objects.filter(job_id=job_id).first()
+    if job:
+        events.publish(job_id, job_snapshot(job))
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_llmresponse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='JobRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.IntegerField()),
+                ('state', models.CharField(choices=[('DONE', 'Done'), ('FAILED', 'Failed')], default='DONE', max_length=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='core.jobrun')),
+            ],
+            options={
+                'db_table': 'core_job_row',
+                'constraints': [models.UniqueConstraint(fields=('job', 'row'), name='uniq_job_row')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-17 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_jobrun_params_jobrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='rows_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='rows_done',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='rows_failed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='rows_per_minute',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='last_progress_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='jobrow',
+            index=models.Index(fields=['job', 'updated_at'], name='job_row_recent_idx'),
+        ),
+    ]
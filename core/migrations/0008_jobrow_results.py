@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_jobrun_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrow',
+            name='icon',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='jobrow',
+            name='category',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='jobrow',
+            name='notes',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='jobrow',
+            name='paragraph',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='jobrow',
+            name='ssml',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='jobrow',
+            index=models.Index(fields=['job', 'category', 'row'], name='job_row_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobrow',
+            index=models.Index(fields=['job', 'state', 'row'], name='job_row_state_idx'),
+        ),
+    ]
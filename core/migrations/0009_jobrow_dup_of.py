@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-17 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_jobrow_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='rows_deduped',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrow',
+            name='dup_of',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='jobrow',
+            name='state',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='DONE', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='jobrow',
+            index=models.Index(fields=['job', 'dup_of'], name='job_row_dup_idx'),
+        ),
+    ]
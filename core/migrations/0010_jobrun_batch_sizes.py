@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_jobrow_dup_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='batch_sizes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
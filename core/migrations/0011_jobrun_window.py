@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_jobrun_batch_sizes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='dispatch_state',
+            field=models.CharField(blank=True, choices=[('', '-'), ('INGESTING', 'Ingesting'), ('SEALED', 'Sealed'), ('FINALIZING', 'Finalizing')], default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='inflight',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='dispatch_cursor',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='run',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='jobrow',
+            name='state',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='DONE', max_length=16),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_jobrun_window'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='provider_batches',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='jobrun',
+            name='dispatch_state',
+            field=models.CharField(blank=True, choices=[('', '-'), ('INGESTING', 'Ingesting'), ('BATCHING', 'Provider batch'), ('SEALED', 'Sealed'), ('FINALIZING', 'Finalizing')], default='', max_length=16),
+        ),
+    ]
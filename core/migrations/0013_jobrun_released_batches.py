@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_jobrun_provider_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='released_batches',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
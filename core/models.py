@@ -121,6 +121,32 @@ class JobRun(models.Model):
     # NEW: final callback task id for chords
     handoff_id = models.CharField(max_length=128, blank=True, default="")
 
+    # orchestrate_paragraphs_job kwargs, so the job can be resumed as submitted
+    params = models.JSONField(default=dict, blank=True)
+
+    # live progress (counters are bumped atomically by save_batch_task)
+    rows_total = models.IntegerField(default=0)
+    rows_done = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    rows_per_minute = models.FloatField(default=0.0)
+    rows_deduped = models.IntegerField(default=0)  # rows filled from an identical earlier row
+    batch_sizes = models.JSONField(default=list, blank=True)  # adaptive mode: [[batch_no, size], ...]
+
+    # windowed dispatch (see core.jobs.job_claim_batches)
+    DISPATCH_STATES = [
+        ("", "-"), ("INGESTING", "Ingesting"), ("BATCHING", "Provider batch"),
+        ("SEALED", "Sealed"), ("FINALIZING", "Finalizing"),
+    ]
+    dispatch_state = models.CharField(max_length=16, choices=DISPATCH_STATES, blank=True, default="")
+    inflight = models.IntegerField(default=0)
+    dispatch_cursor = models.IntegerField(default=0)  # last sheet row handed to a batch
+    released_batches = models.JSONField(default=list, blank=True)  # batch numbers whose slot was freed
+    run = models.IntegerField(default=0)  # shard run of the current pass (0, then +1 per resume)
+    # engine="batch": provider batches of the current pass (see core.services.openai_batch)
+    provider_batches = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    last_progress_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -128,4 +154,50 @@ class JobRun(models.Model):
         db_table = "core_job_run"
 
     def __str__(self):
-        return f"{self.job_id} [{self.state}]"
\ No newline at end of file
+        return f"{self.job_id} [{self.state}]"
+
+
+class JobRow(models.Model):
+    """
+    Per-row checkpoint and result for a paragraph job; resume skips rows that are DONE.
+    Keyed by (job, row), so the results API can page by row number without a scan.
+    """
+    STATES = [("QUEUED", "Queued"), ("PENDING", "Pending"), ("DONE", "Done"), ("FAILED", "Failed")]
+    job = models.ForeignKey(JobRun, on_delete=models.CASCADE, related_name="rows")
+    row = models.IntegerField()  # sheet row number (header is row 1)
+    state = models.CharField(max_length=16, choices=STATES, default="DONE")
+    dup_of = models.IntegerField(null=True, blank=True)  # same input as this row; its result is copied
+    icon = models.CharField(max_length=255, blank=True)
+    category = models.CharField(max_length=255, blank=True)
+    notes = models.TextField(blank=True)
+    paragraph = models.TextField(blank=True)
+    ssml = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "core_job_row"
+        constraints = [models.UniqueConstraint(fields=["job", "row"], name="uniq_job_row")]
+        indexes = [
+            models.Index(fields=["job", "updated_at"], name="job_row_recent_idx"),
+            models.Index(fields=["job", "category", "row"], name="job_row_category_idx"),
+            models.Index(fields=["job", "state", "row"], name="job_row_state_idx"),
+            models.Index(fields=["job", "dup_of"], name="job_row_dup_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id}#{self.row} [{self.state}]"
+
+class LLMResponse(models.Model):
+    """Content-addressed cache of chat completions (see core.services.llm_cache)."""
+    key = models.CharField(max_length=64, unique=True)   # sha256(system, user, model, temperature)
+    model = models.CharField(max_length=64)
+    temperature = models.FloatField(default=0.5)
+    prompt_excerpt = models.CharField(max_length=200, blank=True)
+    response = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"LLM {self.model} · {self.prompt_excerpt[:40]}..."
@@ -119,4 +119,55 @@ Return ONLY a single JSON object (no extra text, no markdown), strictly valid an
   "paragraph": "string — the plain text paragraph ({lo}–{hi} words).",
   "ssml": "<speak>…</speak>"
 }}
-"""
\ No newline at end of file
+"""
+
+# Streaming mode (interactive): plain paragraph only, so tokens can be shown as they
+# arrive; the SSML is built locally from the finished paragraph (core.ssml).
+STREAM_PROMPT_TEMPLATE = """
+You are a senior fashion copywriter.
+Write ONE documentary-style brand paragraph ({lo}–{hi} words) about {icon}.
+- Weave in these notes naturally: {notes}
+- Concrete visuals (fit, fabric, color mood, scene); present tense; no hype, emojis, or markdown.
+- Include one subtle styling suggestion.
+- End with a calm, confident closing line.
+- No em dashes; standard punctuation only.
+
+OUTPUT FORMAT
+Return ONLY the paragraph as plain text: no JSON, no quotes, no labels, no markdown.
+"""
+
+# Packed mode: several sheet rows in one request, rules sent once.
+PACKED_PROMPT_TEMPLATE = """
+You are a senior fashion copywriter AND an SSML engineer.
+You will receive {count} ITEMS, one JSON object per line. Handle EACH item independently:
+1) Write ONE documentary-style brand paragraph ({lo}–{hi} words) about the item's icon.
+- Weave in the item's notes naturally.
+- Concrete visuals (fit, fabric, color mood, scene); present tense; no hype, emojis, or markdown.
+- Include one subtle styling suggestion.
+- End with a calm, confident closing line.
+
+2) Convert that paragraph into VALID, production-ready SSML (ElevenLabs-compatible).
+
+SSML RULES
+- Output ONE <speak> block only (no XML declaration, no code fences, no comments).
+- Wrap content in <prosody rate="medium"> … </prosody>.
+- Use <break> between 120–500ms at natural beats.
+- Use <emphasis level="moderate"> on up to 3 short phrases.
+- Convert years to <say-as interpret-as="date" format="y">YYYY</say-as>.
+- Convert standalone integers to <say-as interpret-as="cardinal">N</say-as> when helpful.
+- Escape special characters (&, <, >, ").
+- End with <mark name="END"/> right before </speak>.
+- No vendor-specific or <audio> tags.
+
+ITEMS
+{items}
+
+OUTPUT FORMAT
+Return ONLY a single JSON object (no extra text, no markdown), strictly valid and double-quoted,
+with exactly one entry per item and each item's "row" copied unchanged:
+{{
+  "results": [
+    {{"row": 0, "paragraph": "string — the plain text paragraph ({lo}–{hi} words).", "ssml": "<speak>…</speak>"}}
+  ]
+}}
+"""
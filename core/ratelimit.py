@@ -0,0 +1,195 @@
+# core/ratelimit.py
+"""
+Cluster-wide token buckets for the OpenAI API, shared by every worker through Redis.
+
+Two buckets (requests/minute and tokens/minute) are checked and debited in one Lua call
+using Redis server time, so processes on different hosts see the same budget. Limits
+start from OPENAI_RPM / OPENAI_TPM and are re-learned from the x-ratelimit-* headers of
+each response; a 429 pauses everyone until the provider's reset time.
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import random
+import logging
+from typing import Mapping, Optional
+
+from core.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RPM = int(os.getenv("OPENAI_RPM", "500"))
+DEFAULT_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+HEADROOM = float(os.getenv("OPENAI_RATE_HEADROOM", "0.9"))  # stay just under the account limit
+MAX_WAIT_SEC = float(os.getenv("OPENAI_RATE_MAX_WAIT", "600"))
+
+# KEYS: rpm bucket, tpm bucket, pause key, limits hash
+# ARGV: default rpm, default tpm, request cost, token cost
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local pause = tonumber(redis.call('GET', KEYS[3]) or '0')
+if pause > now then return pause - now end
+
+local lim = redis.call('HMGET', KEYS[4], 'rpm', 'tpm')
+local rpm = tonumber(lim[1]) or tonumber(ARGV[1])
+local tpm = tonumber(lim[2]) or tonumber(ARGV[2])
+
+local function level(key, limit)
+  local b = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(b[1])
+  local ts = tonumber(b[2])
+  if tokens == nil or ts == nil then return limit end
+  return math.min(limit, tokens + (now - ts) * limit / 60000.0)
+end
+
+local rt = level(KEYS[1], rpm)
+local tt = level(KEYS[2], tpm)
+local rc = math.min(tonumber(ARGV[3]), rpm)
+local tc = math.min(tonumber(ARGV[4]), tpm)
+
+local wait = 0
+if rt < rc then wait = math.max(wait, (rc - rt) * 60000.0 / rpm) end
+if tt < tc then wait = math.max(wait, (tc - tt) * 60000.0 / tpm) end
+if wait == 0 then
+  rt = rt - rc
+  tt = tt - tc
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(rt), 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tostring(tt), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 300000)
+redis.call('PEXPIRE', KEYS[2], 300000)
+return math.ceil(wait)
+"""
+
+# KEYS: rpm bucket, tpm bucket ; ARGV: remaining requests, remaining tokens (-1 = unknown)
+_CLAMP_LUA = """
+local function clamp(key, remaining)
+  if remaining < 0 then return end
+  local cur = tonumber(redis.call('HGET', key, 'tokens'))
+  if cur ~= nil and remaining < cur then
+    redis.call('HSET', key, 'tokens', tostring(remaining))
+  end
+end
+clamp(KEYS[1], tonumber(ARGV[1]))
+clamp(KEYS[2], tonumber(ARGV[2]))
+return 1
+"""
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def parse_reset(value: Optional[str]) -> float:
+    """'6m0s' / '1.5s' / '20ms' -> seconds."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    mult = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * mult[u] for n, u in _DURATION.findall(value))
+
+
+def estimate_tokens(*texts: str, completion: int = 700) -> int:
+    # ~4 chars/token for English prompts, plus the expected completion
+    return sum(len(t or "") for t in texts) // 4 + completion
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        prefix = f"hmva:ratelimit:{name}"
+        self.k_rpm = f"{prefix}:rpm"
+        self.k_tpm = f"{prefix}:tpm"
+        self.k_pause = f"{prefix}:pause"
+        self.k_limits = f"{prefix}:limits"
+        self._acquire = None
+        self._clamp = None
+
+    def _redis(self):
+        r = get_redis()
+        if r is not None and self._acquire is None:
+            self._acquire = r.register_script(_ACQUIRE_LUA)
+            self._clamp = r.register_script(_CLAMP_LUA)
+        return r
+
+    def acquire(self, tokens: int, max_wait: float = MAX_WAIT_SEC) -> float:
+        """
+        Block until one request and `tokens` tokens are available cluster-wide.
+        Returns seconds waited. Without Redis this is a no-op.
+        """
+        r = self._redis()
+        if r is None:
+            return 0.0
+        waited = 0.0
+        while True:
+            try:
+                wait_ms = int(self._acquire(keys=[self.k_rpm, self.k_tpm, self.k_pause, self.k_limits],
+                                            args=[self.rpm, self.tpm, 1, int(tokens)]))
+            except Exception:
+                logger.warning("rate limiter unavailable; proceeding without it", exc_info=True)
+                return waited
+            if wait_ms <= 0:
+                if waited:
+                    logger.info(f"[ratelimit:{self.name}] waited {waited:.1f}s for capacity")
+                return waited
+            if waited >= max_wait:
+                raise RuntimeError(f"{self.name} rate limiter: no capacity after {waited:.0f}s")
+            # small jitter so waiting workers don't wake in lockstep
+            sleep = min(wait_ms / 1000.0, 5.0) * random.uniform(1.0, 1.2)
+            time.sleep(sleep)
+            waited += sleep
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Learn limits and remaining budget from x-ratelimit-* response headers."""
+        r = self._redis()
+        if r is None or not headers:
+            return
+        try:
+            limits = {}
+            lim_req = headers.get("x-ratelimit-limit-requests")
+            lim_tok = headers.get("x-ratelimit-limit-tokens")
+            if lim_req:
+                limits["rpm"] = max(1, int(int(lim_req) * HEADROOM))
+            if lim_tok:
+                limits["tpm"] = max(1, int(int(lim_tok) * HEADROOM))
+            if limits:
+                r.hset(self.k_limits, mapping=limits)
+                r.expire(self.k_limits, 3600)
+            rem_req = headers.get("x-ratelimit-remaining-requests")
+            rem_tok = headers.get("x-ratelimit-remaining-tokens")
+            if rem_req or rem_tok:
+                self._clamp(keys=[self.k_rpm, self.k_tpm],
+                            args=[int(rem_req) if rem_req else -1, int(rem_tok) if rem_tok else -1])
+        except Exception:
+            logger.debug("could not apply rate-limit headers", exc_info=True)
+
+    def reconcile(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once real usage is known (credit or debt)."""
+        r = self._redis()
+        if r is None or not actual:
+            return
+        try:
+            r.hincrbyfloat(self.k_tpm, "tokens", float(estimated - actual))
+        except Exception:
+            pass
+
+    def pause(self, seconds: float) -> None:
+        """Stop every worker until the provider's reset time (after a 429)."""
+        r = self._redis()
+        if r is None or seconds <= 0:
+            return
+        try:
+            now_s, now_us = r.time()
+            until = int(now_s) * 1000 + int(now_us) // 1000 + int(seconds * 1000)
+            r.set(self.k_pause, until, px=int(seconds * 1000) + 1000)
+        except Exception:
+            pass
+
+
+openai_limiter = TokenBucketLimiter("openai", DEFAULT_RPM, DEFAULT_TPM)
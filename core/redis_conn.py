@@ -0,0 +1,21 @@
+# core/redis_conn.py
+from typing import Optional
+
+import redis
+from django.conf import settings
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """
+    Shared client for the Redis the broker already runs on (one pool per process).
+    Returns None when no Redis URL is configured (web-only / local dev).
+    """
+    global _client
+    if _client is None:
+        url = getattr(settings, "REDIS_URL", "") or getattr(settings, "CELERY_BROKER_URL", "")
+        if not url or not url.startswith(("redis://", "rediss://", "unix://")):
+            return None
+        _client = redis.Redis.from_url(url, socket_timeout=5, health_check_interval=30)
+    return _client
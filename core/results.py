@@ -0,0 +1,134 @@
+# core/results.py
+from __future__ import annotations
+
+import os
+import re
+import json
+import glob
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.files.storage import default_storage
+from openpyxl import Workbook
+
+RESULTS_DIR = "uploads/results"
+RESULT_HEADERS = ["row", "icon", "category", "notes", "paragraph", "ssml"]
+
+
+def results_rel(job_id: str) -> str:
+    return f"{RESULTS_DIR}/{job_id}.xlsx"
+
+
+def shards_rel(job_id: str) -> str:
+    return f"{RESULTS_DIR}/{job_id}.parts"
+
+
+def _abs_dir(relpath: str) -> str:
+    abs_path = default_storage.path(relpath)
+    os.makedirs(abs_path, exist_ok=True)
+    return abs_path
+
+
+_SHARD_RE = re.compile(r"run(\d+)_batch_(\d+)\.jsonl$")
+
+
+def write_batch_shard(job_id: str, batch_no: int, rows: Iterable[Dict], run: int = 0) -> str:
+    """
+    Writes one batch as its own JSONL shard: uploads/results/<job_id>.parts/run00_batch_000001.jsonl
+    Cost depends only on the batch, never on how many rows the job already has.
+    Written to a temp file and renamed, so a retried batch simply replaces its shard.
+    `run` is 0 for the first pass and increments with every resume.
+    """
+    shard_dir = _abs_dir(shards_rel(job_id))
+    path = os.path.join(shard_dir, f"run{int(run):02d}_batch_{int(batch_no):06d}.jsonl")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for item in rows:
+            rec = {h: item.get(h, "") for h in RESULT_HEADERS}
+            fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def _shard_runs(job_id: str) -> Dict[int, List[str]]:
+    """{run: [shard paths in batch order]}"""
+    rel = shards_rel(job_id)
+    if not default_storage.exists(rel):
+        return {}
+    runs: Dict[int, List[Tuple[int, str]]] = {}
+    for path in glob.glob(os.path.join(default_storage.path(rel), "run*_batch_*.jsonl")):
+        m = _SHARD_RE.search(path)
+        if m:
+            runs.setdefault(int(m.group(1)), []).append((int(m.group(2)), path))
+    return {run: [p for _, p in sorted(items)] for run, items in runs.items()}
+
+
+def has_shards(job_id: str) -> bool:
+    return bool(_shard_runs(job_id))
+
+
+def next_run(job_id: str) -> int:
+    runs = _shard_runs(job_id)
+    return (max(runs) + 1) if runs else 0
+
+
+def _iter_paths(paths: List[str]) -> Iterator[Dict]:
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _row_key(rec: Dict) -> int:
+    return int(rec.get("row") or 0)
+
+
+def _latest_per_row(recs: Iterable[Dict]) -> Iterator[Dict]:
+    """Collapse runs of equal row numbers in a row-ordered stream, keeping the last one."""
+    prev = None
+    for rec in recs:
+        if prev is not None and _row_key(prev) != _row_key(rec):
+            yield prev
+        prev = rec
+    if prev is not None:
+        yield prev
+
+
+def iter_shard_rows(job_id: str) -> Iterator[Dict]:
+    """
+    Yield saved rows in sheet-row order, one line at a time.
+    Each run's shards are already row-ordered, so runs are k-way merged (k = 1 + resumes);
+    when a resume regenerated a row, the latest run wins.
+    """
+    runs = _shard_runs(job_id)
+    streams = [_iter_paths(runs[r]) for r in sorted(runs)]
+    # heapq.merge is stable: for equal rows, earlier runs come out first
+    return _latest_per_row(heapq.merge(*streams, key=_row_key))
+
+
+def merge_shards_to_xlsx(job_id: str, results_path: str, extra: Optional[Iterable[Dict]] = None) -> int:
+    """
+    Single streaming pass over all shards into the final workbook.
+    `extra` is another row-ordered stream merged in (rows filled outside the shards,
+    e.g. in-job duplicates); on equal rows it wins.
+    Uses a write-only workbook so memory stays flat regardless of row count.
+    Returns the number of data rows written.
+    """
+    abs_results = default_storage.path(results_path)
+    os.makedirs(os.path.dirname(abs_results), exist_ok=True)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(RESULT_HEADERS)
+    count = 0
+    for rec in _latest_per_row(heapq.merge(iter_shard_rows(job_id), extra or (), key=_row_key)):
+        ws.append([rec.get(h, "") for h in RESULT_HEADERS])
+        count += 1
+
+    # Save next to the target and swap in, so readers never see a half-written file
+    tmp = f"{abs_results}.tmp"
+    wb.save(tmp)
+    os.replace(tmp, abs_results)
+    return count
@@ -0,0 +1,108 @@
+# core/schemas.py
+"""
+JSON schemas for the structured LLM call sites, sent as OpenAI `json_schema` response
+formats (strict mode) so answers are constrained at decode time instead of being
+guessed at afterwards. parse_structured checks an answer against the same schema;
+callers re-ask (bypassing the LLM cache) only for answers that fail, and every
+outcome is counted per job and cluster-wide.
+"""
+import os
+import json
+import logging
+from typing import Optional
+
+from core.redis_conn import get_redis
+from core.ssml import current_job
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUTS = os.getenv("OPENAI_STRUCTURED_OUTPUTS", "1") not in ("0", "false", "False")
+REASKS = int(os.getenv("OPENAI_STRUCTURED_REASKS", "2"))  # extra calls for an unparseable answer
+
+GLOBAL_KEY = "hmva:structured:stats"
+
+
+def _object(**props) -> dict:
+    # strict mode: every property required, nothing else allowed
+    return {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+
+
+_STRING = {"type": "string"}
+
+SCHEMAS = {
+    "paragraph_ssml": _object(paragraph=_STRING, ssml=_STRING),
+    "paragraph_ssml_packed": _object(results={
+        "type": "array",
+        "items": _object(row={"type": "integer"}, paragraph=_STRING, ssml=_STRING),
+    }),
+    "captions": _object(
+        caption_yt=_STRING,
+        caption_tt=_STRING,
+        caption_ig_reels=_STRING,
+        caption_ig_stories=_STRING,
+        caption_fb_reels=_STRING,
+    ),
+}
+
+
+def response_format(name: str) -> Optional[dict]:
+    """OpenAI response_format for a schema, or None to keep plain json_object mode."""
+    if not STRUCTURED_OUTPUTS:
+        return None
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": SCHEMAS[name]}}
+
+
+def matches(value, schema: dict) -> bool:
+    """Structural check for the subset of JSON schema used in SCHEMAS."""
+    kind = schema.get("type")
+    if kind == "object":
+        return (
+            isinstance(value, dict)
+            and all(k in value for k in schema.get("required", ()))
+            and all(matches(value[k], s) for k, s in schema["properties"].items() if k in value)
+        )
+    if kind == "array":
+        return isinstance(value, list) and all(matches(v, schema["items"]) for v in value)
+    if kind == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "string":
+        return isinstance(value, str)
+    return True
+
+
+def parse_structured(raw: str, name: str) -> Optional[dict]:
+    """The answer as a dict if it is JSON matching SCHEMAS[name], else None."""
+    try:
+        data = json.loads(raw or "")
+    except ValueError:
+        return None
+    return data if matches(data, SCHEMAS[name]) else None
+
+
+def record(outcome: str, n: int = 1) -> None:
+    """Count "ok" / "failed" answers, "reasked" calls and rows "exhausted" after all re-asks."""
+    r = get_redis()
+    if r is None or n <= 0:
+        return
+    try:
+        pipe = r.pipeline()
+        job_id = current_job()
+        for key in [GLOBAL_KEY] + ([f"hmva:structured:{job_id}"] if job_id else []):
+            pipe.hincrby(key, outcome, n)
+            pipe.expire(key, 7 * 24 * 3600)
+        pipe.execute()
+    except Exception:
+        logger.debug("structured output stats unavailable", exc_info=True)
+
+
+def structured_stats(job_id=None) -> dict:
+    counts = dict.fromkeys(("ok", "failed", "reasked", "exhausted"), 0)
+    r = get_redis()
+    if r is not None:
+        try:
+            raw = r.hgetall(f"hmva:structured:{job_id}" if job_id else GLOBAL_KEY)
+            counts.update({k.decode(): int(v) for k, v in raw.items()})
+        except Exception:
+            logger.debug("structured output stats unavailable", exc_info=True)
+    answers = counts["ok"] + counts["failed"]
+    return {**counts, "failure_rate": round(counts["failed"] / answers, 4) if answers else 0.0}
@@ -0,0 +1,200 @@
+# core/services/llm_cache.py
+import hashlib, json, logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import LLMResponse
+from ..adapters import llm_openai
+from ..redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "hmva:llm_cache:stats"
+EVICT_EVERY = 100  # check the size bound once per N inserts
+
+_api_calls: ContextVar = ContextVar("llm_api_calls", default=None)
+
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=int(getattr(settings, "LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)))
+
+
+def _hash_prompt(system: str, user: str, model: str, temperature: float, response_format: dict | None = None) -> str:
+    parts = {"system": system, "user": user, "model": model, "temperature": round(float(temperature), 3)}
+    if response_format:
+        # only schema-constrained calls carry it, so existing cache keys stay valid
+        parts["response_format"] = response_format
+    key = json.dumps(parts, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _count(field: str) -> None:
+    try:
+        r = get_redis()
+        if r is not None:
+            r.hincrby(STATS_KEY, field, 1)
+    except Exception:
+        logger.debug("llm cache stats unavailable", exc_info=True)
+
+
+@contextmanager
+def api_calls():
+    """
+    Count the requests inside the block that reached the API (misses, bypasses, cache
+    disabled): `with api_calls() as calls: ...`, then calls[0]. 0 means every answer
+    came from the cache. Asyncio tasks started inside the block share the count.
+    """
+    token = _api_calls.set([0])
+    try:
+        yield _api_calls.get()
+    finally:
+        _api_calls.reset(token)
+
+
+def _called() -> None:
+    calls = _api_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def cache_stats() -> dict:
+    """Cluster-wide {"hit": n, "miss": n, "bypass": n, "evicted": n} counters."""
+    try:
+        r = get_redis()
+        raw = r.hgetall(STATS_KEY) if r is not None else {}
+    except Exception:
+        raw = {}
+    return {k.decode(): int(v) for k, v in raw.items()}
+
+
+def _evict_lru() -> None:
+    max_entries = int(getattr(settings, "LLM_CACHE_MAX_ENTRIES", 50000))
+    # expired rows first, then least recently used beyond the bound
+    deleted, _ = LLMResponse.objects.filter(created_at__lt=timezone.now() - _ttl()).delete()
+    overflow = LLMResponse.objects.count() - max_entries
+    if overflow > 0:
+        stale = LLMResponse.objects.order_by("last_used_at").values_list("pk", flat=True)[:overflow]
+        more, _ = LLMResponse.objects.filter(pk__in=list(stale)).delete()
+        deleted += more
+    if deleted:
+        try:
+            r = get_redis()
+            if r is not None:
+                r.hincrby(STATS_KEY, "evicted", deleted)
+        except Exception:
+            pass
+
+
+def _lookup(key: str):
+    now = timezone.now()
+    hit = LLMResponse.objects.filter(key=key, created_at__gte=now - _ttl()).values_list("response", flat=True).first()
+    if hit is not None:
+        LLMResponse.objects.filter(key=key).update(hit_count=F("hit_count") + 1, last_used_at=now)
+    return hit
+
+
+def _store(key: str, model: str, user: str, temperature: float, content: str) -> None:
+    now = timezone.now()
+    rec, _ = LLMResponse.objects.update_or_create(
+        key=key,
+        defaults={
+            "model": model,
+            "temperature": float(temperature),
+            "prompt_excerpt": user.strip()[:200],
+            "response": content,
+            "created_at": now,
+            "last_used_at": now,
+        },
+    )
+    if rec.pk % EVICT_EVERY == 0:
+        _evict_lru()
+
+
+def cached_chat(system: str, user: str, temperature: float = 0.5, *, bypass: bool = False,
+                response_format: dict | None = None, hedge: bool = False) -> str:
+    """
+    llm_openai.chat behind a DB cache keyed on (system, user, model, temperature, response_format).
+    bypass=True always calls the API (the fresh answer still refreshes the cache).
+    Only successful responses are stored; API errors propagate unchanged.
+    hedge is passed to llm_openai.chat for misses (interactive callers).
+    """
+    if not getattr(settings, "LLM_CACHE_ENABLED", True):
+        _called()
+        return llm_openai.chat(system, user, temperature, response_format, hedge=hedge)
+
+    model = llm_openai.current_model()
+    key = _hash_prompt(system, user, model, temperature, response_format)
+
+    if not bypass:
+        hit = _lookup(key)
+        if hit is not None:
+            _count("hit")
+            return hit
+        _count("miss")
+    else:
+        _count("bypass")
+
+    _called()
+    content = llm_openai.chat(system, user, temperature, response_format, hedge=hedge)
+    _store(key, model, user, temperature, content)
+    return content
+
+
+def cached_chat_stream(system: str, user: str, temperature: float = 0.5, *, bypass: bool = False):
+    """
+    llm_openai.chat_stream behind the same cache: a hit is yielded as one chunk, a miss
+    streams from the API and stores the full answer once the stream completes.
+    """
+    if not getattr(settings, "LLM_CACHE_ENABLED", True):
+        yield from llm_openai.chat_stream(system, user, temperature)
+        return
+
+    model = llm_openai.current_model()
+    key = _hash_prompt(system, user, model, temperature)
+
+    if not bypass:
+        hit = _lookup(key)
+        if hit is not None:
+            _count("hit")
+            yield hit
+            return
+        _count("miss")
+    else:
+        _count("bypass")
+
+    parts = []
+    for delta in llm_openai.chat_stream(system, user, temperature):
+        parts.append(delta)
+        yield delta
+    _store(key, model, user, temperature, "".join(parts))
+
+
+async def acached_chat(system: str, user: str, temperature: float = 0.5, *, client, bypass: bool = False,
+                       response_format: dict | None = None) -> str:
+    """Async cached_chat for the asyncio executor; DB work runs via sync_to_async."""
+    if not getattr(settings, "LLM_CACHE_ENABLED", True):
+        _called()
+        return await llm_openai.achat(system, user, temperature, client=client, response_format=response_format)
+
+    model = llm_openai.current_model()
+    key = _hash_prompt(system, user, model, temperature, response_format)
+
+    if not bypass:
+        hit = await sync_to_async(_lookup)(key)
+        if hit is not None:
+            _count("hit")
+            return hit
+        _count("miss")
+    else:
+        _count("bypass")
+
+    _called()
+    content = await llm_openai.achat(system, user, temperature, client=client, response_format=response_format)
+    await sync_to_async(_store)(key, model, user, temperature, content)
+    return content
@@ -0,0 +1,114 @@
+# core/services/openai_batch.py
+"""
+Offline paragraph generation through the OpenAI Batch API (engine="batch").
+
+orchestrate_paragraphs_job spools the sheet into JobRow as usual, then submit()
+writes one request per QUEUED row to JSONL input files (at most MAX_REQUESTS each),
+uploads them and opens one provider batch per file. poll_openai_batches_task (beat)
+calls poll(): finished batches have their output streamed into JobRow, and once
+every batch is back the job is handed to the normal windowed save / finalize flow.
+Rows the provider failed on have no output and are checkpointed FAILED by
+save_batch_task, so a resume picks them up.
+"""
+import os
+import json
+import logging
+import tempfile
+from typing import Dict, List
+
+from django.utils import timezone
+
+from ..adapters import llm_openai
+from ..jobs import job_store_outputs
+from ..models import JobRun, JobRow
+from ..schemas import record as record_structured, response_format
+from ..ssml import ssml_job
+from ..utils import PARAGRAPH_SSML_SYSTEM, build_prompt, parse_openai_json
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUESTS = int(os.getenv("OPENAI_BATCH_MAX_REQUESTS", "50000"))  # provider limit per batch file
+STORE_CHUNK = 500  # outputs written to JobRow per bulk update
+
+
+def _write_input(rows: List[dict], fh) -> None:
+    fmt = response_format("paragraph_ssml")
+    for r in rows:
+        prompt = build_prompt(icon=r["icon"], notes=r["notes"], category=r["category"])
+        line = llm_openai.batch_request(str(r["row"]), PARAGRAPH_SSML_SYSTEM, prompt, 0.2, fmt)
+        fh.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _open_batch(job_id, part: int, rows: List[dict]) -> Dict:
+    with tempfile.TemporaryFile() as fh:
+        _write_input(rows, fh)
+        fh.seek(0)
+        file_id = llm_openai.upload_batch_file(fh, name=f"{job_id}-{part}.jsonl")
+    batch = llm_openai.create_batch(file_id, metadata={"job_id": str(job_id), "part": str(part)})
+    logger.info(f"[Job {job_id}] Provider batch {batch['id']} opened for {len(rows)} row(s)")
+    return {"id": batch["id"], "input_file_id": file_id, "rows": len(rows),
+            "status": batch.get("status", "validating"), "stored": False}
+
+
+def submit(job_id) -> List[Dict]:
+    """Open provider batches for every QUEUED row of the job; returns what was stored on JobRun."""
+    qs = (JobRow.objects.filter(job_id=job_id, state="QUEUED", dup_of__isnull=True)
+          .order_by("row").values("row", "icon", "category", "notes"))
+    batches, chunk = [], []
+    for r in qs.iterator(chunk_size=2000):
+        chunk.append(r)
+        if len(chunk) >= MAX_REQUESTS:
+            batches.append(_open_batch(job_id, len(batches) + 1, chunk))
+            chunk = []
+    if chunk:
+        batches.append(_open_batch(job_id, len(batches) + 1, chunk))
+    JobRun.objects.filter(job_id=job_id).update(provider_batches=batches, updated_at=timezone.now())
+    return batches
+
+
+def _store(job_id, file_id: str) -> int:
+    """Stream one output file into JobRow; returns rows with a usable answer."""
+    stored, buf = 0, []
+    with ssml_job(job_id):
+        for custom_id, content in llm_openai.iter_batch_results(file_id):
+            try:
+                row = int(custom_id)
+            except (TypeError, ValueError):
+                continue
+            paragraph, ssml = parse_openai_json(content or "")
+            if content is not None:
+                record_structured("ok" if paragraph else "failed")
+            if paragraph:
+                buf.append({"row": row, "paragraph": paragraph, "ssml": ssml})
+            if len(buf) >= STORE_CHUNK:
+                job_store_outputs(job_id, buf)
+                stored += len(buf)
+                buf = []
+        if buf:
+            job_store_outputs(job_id, buf)
+            stored += len(buf)
+    return stored
+
+
+def poll(job: JobRun) -> bool:
+    """
+    Refresh the job's provider batches and store the output of those that finished.
+    Returns True once every batch is terminal and stored.
+    """
+    batches = [dict(b) for b in (job.provider_batches or [])]
+    for b in batches:
+        if b.get("stored"):
+            continue
+        info = llm_openai.retrieve_batch(b["id"])
+        b["status"] = info.get("status", b.get("status"))
+        b["request_counts"] = info.get("request_counts") or {}
+        if b["status"] not in llm_openai.BATCH_TERMINAL:
+            continue
+        # expired/cancelled batches still return whatever finished before the cut-off
+        if info.get("output_file_id"):
+            b["answered"] = _store(job.job_id, info["output_file_id"])
+        b["stored"] = True
+        logger.info(f"[Job {job.job_id}] Provider batch {b['id']} {b['status']}: "
+                    f"{b.get('answered', 0)}/{b['rows']} row(s) answered")
+    JobRun.objects.filter(job_id=job.job_id).update(provider_batches=batches, updated_at=timezone.now())
+    return all(b.get("stored") for b in batches)
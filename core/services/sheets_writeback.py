@@ -0,0 +1,239 @@
+# core/services/sheets_writeback.py
+"""
+Google Sheets write-back for paragraph jobs.
+
+save_batch_task buffers finished rows per job in Redis; a flush takes everything
+buffered, merges contiguous rows into multi-row ranges and sends them in one
+values.batchUpdate. Flushes happen once FLUSH_ROWS rows are waiting or FLUSH_SECONDS
+have passed, and finalize_job_task forces the last one. Write requests go through
+a shared token bucket sized to the Sheets write quota, and a 429 pauses every worker.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from ..ratelimit import TokenBucketLimiter
+from ..redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ROWS = int(os.getenv("SHEETS_FLUSH_ROWS", "500"))
+FLUSH_SECONDS = float(os.getenv("SHEETS_FLUSH_SECONDS", "15"))
+MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "6"))
+KEY_TTL = 2 * 24 * 3600
+
+# Sheets allows 60 write requests/minute per user per project by default
+sheets_limiter = TokenBucketLimiter("sheets", int(os.getenv("SHEETS_WRITE_RPM", "55")), 10 ** 9)
+
+# KEYS: lock ; ARGV: token. Delete the lock only if this flush still owns it.
+_UNLOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_client = None
+
+
+def _a1_col(n: int) -> str:
+    """1 -> A, 26 -> Z, 27 -> AA ..."""
+    s = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def _sheets_client():
+    """One Sheets client per worker process (building it re-reads the credentials)."""
+    global _client
+    if _client is None:
+        sa_path = os.environ.get("GOOGLE_SA_JSON") or getattr(settings, "GOOGLE_SA_JSON", None)
+        if not sa_path:
+            raise RuntimeError("GOOGLE_SA_JSON is not set for Google Sheets write-back.")
+        creds = Credentials.from_service_account_file(sa_path, scopes=["https://www.googleapis.com/auth/spreadsheets"])
+        _client = build("sheets", "v4", credentials=creds, cache_discovery=False).spreadsheets()
+    return _client
+
+
+def _execute(request):
+    """Run a Sheets request under the shared quota, backing off on 429/5xx."""
+    for attempt in range(MAX_RETRIES + 1):
+        sheets_limiter.acquire(1)
+        try:
+            return request.execute()
+        except HttpError as e:
+            status = getattr(e.resp, "status", 0)
+            if status not in (429, 500, 502, 503) or attempt >= MAX_RETRIES:
+                raise
+            wait = min(64.0, 2 ** attempt) + random.uniform(0, 1)
+            if status == 429:
+                sheets_limiter.pause(wait)
+            logger.warning(f"Sheets API {status}; retrying in {wait:.1f}s")
+            time.sleep(wait)
+
+
+def _ensure_sheet_headers_and_map(sheets, sheet_id: str, sheet_name: str, needed_cols: List[str]) -> Dict[str, int]:
+    """
+    Ensure 'needed_cols' appear in the first row. Return a 1-based name->index map.
+    """
+    head_resp = _execute(sheets.values().get(spreadsheetId=sheet_id, range=f"{sheet_name}!1:1"))
+    header = head_resp.get("values", [[]])
+    header = header[0] if header else []
+
+    changed = False
+    for col in needed_cols:
+        if col not in header:
+            header.append(col)
+            changed = True
+    if changed:
+        _execute(sheets.values().update(
+            spreadsheetId=sheet_id,
+            range=f"{sheet_name}!A1:{_a1_col(len(header))}1",
+            valueInputOption="RAW",
+            body={"values": [header]},
+        ))
+
+    return {name: i + 1 for i, name in enumerate(header)}
+
+
+def _keys(job_id) -> Tuple[str, str, str]:
+    prefix = f"hmva:sheets:{job_id}"
+    return f"{prefix}:pending", f"{prefix}:meta", f"{prefix}:lock"
+
+
+def _columns(job_id, sheet_id: str, sheet_name: str, meta: Optional[dict] = None) -> Tuple[int, int]:
+    """(Paragraph col, SSML col), resolved once per job and shared through the meta hash."""
+    if meta and meta.get("p_col") and meta.get("s_col"):
+        cols = (int(meta["p_col"]), int(meta["s_col"]))
+    else:
+        colmap = _ensure_sheet_headers_and_map(_sheets_client(), sheet_id, sheet_name, ["Paragraph", "SSML"])
+        cols = (colmap["Paragraph"], colmap["SSML"])
+        r = get_redis()
+        if r is not None:
+            r.hset(_keys(job_id)[1], mapping={"p_col": cols[0], "s_col": cols[1]})
+    return cols
+
+
+def _ranges(sheet_name: str, rows: Dict[int, Tuple[str, str]], p_col: int, s_col: int) -> List[dict]:
+    """Contiguous row numbers become one range (one per column unless they are adjacent)."""
+    data = []
+    nums = sorted(rows)
+    start = 0
+    while start < len(nums):
+        end = start
+        while end + 1 < len(nums) and nums[end + 1] == nums[end] + 1:
+            end += 1
+        first, last = nums[start], nums[end]
+        block = [rows[n] for n in nums[start:end + 1]]
+        if s_col == p_col + 1:
+            data.append({"range": f"{sheet_name}!{_a1_col(p_col)}{first}:{_a1_col(s_col)}{last}",
+                         "values": [[p, s] for p, s in block]})
+        else:
+            data.append({"range": f"{sheet_name}!{_a1_col(p_col)}{first}:{_a1_col(p_col)}{last}",
+                         "values": [[p] for p, _ in block]})
+            data.append({"range": f"{sheet_name}!{_a1_col(s_col)}{first}:{_a1_col(s_col)}{last}",
+                         "values": [[s] for _, s in block]})
+        start = end + 1
+    return data
+
+
+def _write(job_id, sheet_id: str, sheet_name: str, rows: Dict[int, Tuple[str, str]], meta: Optional[dict] = None) -> None:
+    if not rows:
+        return
+    p_col, s_col = _columns(job_id, sheet_id, sheet_name, meta)
+    sheets = _sheets_client()
+    nums = sorted(rows)
+    for i in range(0, len(nums), FLUSH_ROWS):
+        part = {n: rows[n] for n in nums[i:i + FLUSH_ROWS]}
+        _execute(sheets.values().batchUpdate(
+            spreadsheetId=sheet_id,
+            body={"valueInputOption": "RAW", "data": _ranges(sheet_name, part, p_col, s_col)},
+        ))
+
+
+def buffer_rows(job_id, sheet_id: str, sheet_name: str, results: Iterable[dict]) -> None:
+    """Queue a saved batch for write-back and flush if a threshold is reached."""
+    rows = {}
+    for item in results:
+        rownum = int(item.get("row") or 0)
+        if rownum < 2:
+            continue
+        rows[rownum] = ((item.get("paragraph") or "").strip(), (item.get("ssml") or "").strip())
+    if not rows:
+        return
+
+    r = get_redis()
+    if r is None:
+        _write(job_id, sheet_id, sheet_name, rows)
+        return
+
+    pending, meta, _ = _keys(job_id)
+    pipe = r.pipeline()
+    pipe.hset(pending, mapping={n: json.dumps(v, ensure_ascii=False) for n, v in rows.items()})
+    pipe.hsetnx(meta, "last_flush", time.time())
+    pipe.hset(meta, mapping={"sheet_id": sheet_id, "sheet_name": sheet_name})
+    pipe.expire(pending, KEY_TTL)
+    pipe.expire(meta, KEY_TTL)
+    pipe.execute()
+    flush(job_id)
+
+
+def flush(job_id, force: bool = False) -> int:
+    """
+    Write out everything buffered for the job if a threshold is met (or force).
+    Only one worker flushes a job at a time (the lock holds a per-flush token and
+    is only released by its owner, so a flush that outlives the TTL cannot free
+    someone else's); rows that fail to write go back into the buffer unless a
+    newer value arrived meanwhile. Returns rows written.
+    """
+    r = get_redis()
+    if r is None:
+        return 0
+    pending, meta_key, lock = _keys(job_id)
+    meta = {k.decode(): v.decode() for k, v in r.hgetall(meta_key).items()}
+    if not meta.get("sheet_id"):
+        return 0
+    if not force:
+        waiting = r.hlen(pending)
+        age = time.time() - float(meta.get("last_flush") or 0)
+        if waiting < FLUSH_ROWS and age < FLUSH_SECONDS:
+            return 0
+
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + (120 if force else 0)
+    while not r.set(lock, token, nx=True, ex=300):
+        if time.monotonic() >= deadline:
+            return 0  # someone else is flushing; they will pick these rows up
+        time.sleep(0.5)
+
+    try:
+        pipe = r.pipeline()
+        pipe.hgetall(pending)
+        pipe.delete(pending)
+        raw, _ = pipe.execute()
+        rows = {int(k): tuple(json.loads(v)) for k, v in raw.items()}
+        try:
+            _write(job_id, meta["sheet_id"], meta["sheet_name"], rows, meta)
+        except Exception:
+            logger.exception(f"[Job {job_id}] Google Sheet write-back failed; {len(rows)} row(s) re-queued")
+            restore = r.pipeline()
+            for k, v in raw.items():
+                restore.hsetnx(pending, k, v)
+            restore.expire(pending, KEY_TTL)
+            restore.execute()
+            return 0
+        r.hset(meta_key, "last_flush", time.time())
+        return len(rows)
+    finally:
+        r.register_script(_UNLOCK_LUA)(keys=[lock], args=[token])
@@ -0,0 +1,265 @@
+# core/ssml.py
+"""
+Rule-based SSML for a plain paragraph, following the SSML RULES in PROMPT_TEMPLATE:
+one <speak> block, a <prosody rate="medium"> wrapper, a <break> at every sentence
+boundary, years as say-as date and standalone integers as say-as cardinal, escaped
+text, and <mark name="END"/> right before </speak>. Deterministic and instant, so it
+replaces the extra LLM round-trip when the model's SSML is unusable.
+
+Model SSML is checked first: validate_ssml parses it and enforces a tag allowlist and
+the END mark, repair_ssml fixes what it can locally (escaping, unbalanced or
+disallowed tags, END placement) and only rebuilds from the paragraph as a last resort.
+"""
+import re
+import logging
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from contextvars import ContextVar
+from xml.sax.saxutils import escape
+
+from core.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BREAK_MS = 300  # rules allow 120–500ms at natural beats
+
+_SENTENCE_END = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["”’\')\]]))\s+')
+# 4-digit years 1000–2099 that stand alone (not 1960s, 1,000, 3.5 or 20-30)
+_YEAR = re.compile(r'(?<![\w\-/])(?<!\d[.,])(1\d{3}|20\d{2})(?![\w\-/]|[.,]\d)')
+_INTEGER = re.compile(r'(?<![\w\-/])(?<!\d[.,])(\d+)(?![\w\-/]|[.,]\d)')
+_ESCAPES = {'"': "&quot;"}
+
+
+def split_sentences(text: str) -> list:
+    text = " ".join((text or "").split())
+    if not text:
+        return []
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def _say_as(escaped: str) -> str:
+    out = _YEAR.sub(r'<say-as interpret-as="date" format="y">\1</say-as>', escaped)
+    # integers that are not already inside a say-as tag
+    parts = re.split(r'(<say-as[^>]*>.*?</say-as>)', out)
+    return "".join(p if p.startswith("<say-as") else _INTEGER.sub(
+        r'<say-as interpret-as="cardinal">\1</say-as>', p) for p in parts)
+
+
+def build_ssml(paragraph: str, rate: str = "medium", break_ms: int = SENTENCE_BREAK_MS) -> str:
+    """Plain paragraph -> '<speak><prosody ...>…</prosody><mark name="END"/></speak>'."""
+    sentences = [_say_as(escape(s, _ESCAPES)) for s in split_sentences(paragraph)]
+    body = f'<break time="{int(break_ms)}ms"/>'.join(sentences)
+    return f'<speak><prosody rate="{rate}">{body}</prosody><mark name="END"/></speak>'
+
+
+# ---------------------------------------------------------------- validate / repair
+# Tags ElevenLabs accepts and PROMPT_TEMPLATE asks for; anything else is unwrapped
+# (its text kept), except DROP_TAGS which go with their content.
+ALLOWED_TAGS = {"speak", "prosody", "break", "emphasis", "say-as", "mark", "p", "s", "sub"}
+DROP_TAGS = {"audio"}
+VOID_TAGS = {"break", "mark"}
+
+_FENCE = re.compile(r"^\s*```(?:xml|ssml)?\s*|\s*```\s*$", re.I)
+_DECL = re.compile(r"<\?xml[^>]*\?>|<!--.*?-->", re.S)
+_BARE_AMP = re.compile(r"&(?!(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);)")
+_BARE_LT = re.compile(r"<(?![/A-Za-z])")
+_TAG = re.compile(r"<(/?)([A-Za-z][\w:.-]*)([^<>]*?)(/?)>")
+_BREAK_TIME = re.compile(r"^\d+(?:\.\d+)?m?s$")
+
+
+def _local(tag) -> str:
+    return str(tag).rsplit("}", 1)[-1].lower()
+
+
+def validate_ssml(ssml: str) -> list:
+    """Problems with an SSML string (empty list = ready for TTS)."""
+    try:
+        root = ET.fromstring((ssml or "").strip())
+    except ET.ParseError as e:
+        return [f"not well-formed: {e}"]
+    problems = []
+    if _local(root.tag) != "speak":
+        problems.append(f"root is <{_local(root.tag)}>, not <speak>")
+    for el in root.iter():
+        tag = _local(el.tag)
+        if tag not in ALLOWED_TAGS:
+            problems.append(f"<{tag}> not allowed")
+        elif tag == "speak" and el is not root:
+            problems.append("nested <speak>")
+        elif tag == "break" and el.get("time") and not _BREAK_TIME.match(el.get("time")):
+            problems.append(f"bad break time {el.get('time')!r}")
+    ends = [el for el in root.iter() if _local(el.tag) == "mark" and el.get("name") == "END"]
+    if not ends:
+        problems.append("missing END mark")
+    elif len(ends) > 1 or len(root) == 0 or root[-1] is not ends[0] or (ends[0].tail or "").strip():
+        problems.append("END mark is not last")
+    if not "".join(root.itertext()).strip():
+        problems.append("no text")
+    return problems
+
+
+def _balance(text: str) -> str:
+    """Drop stray closing tags, self-close void tags and close whatever is left open."""
+    out, stack, pos = [], [], 0
+    for m in _TAG.finditer(text):
+        out.append(text[pos:m.start()])
+        pos = m.end()
+        closing, name, attrs, selfclose = m.groups()
+        tag = name.lower()
+        if tag in VOID_TAGS:
+            if not closing:
+                out.append(f"<{name}{attrs.rstrip()}/>")
+        elif selfclose:
+            out.append(m.group(0))
+        elif not closing:
+            stack.append(name)
+            out.append(m.group(0))
+        elif name in stack:
+            while stack:
+                top = stack.pop()
+                out.append(f"</{top}>")
+                if top == name:
+                    break
+    out.append(text[pos:])
+    out.extend(f"</{name}>" for name in reversed(stack))
+    return "".join(out)
+
+
+def _unwrap(parent, child, keep_content: bool = True) -> None:
+    """Replace `child` by its text and children (or by nothing), keeping its tail."""
+    i = list(parent).index(child)
+    prev = parent[i - 1] if i else None
+
+    def add(s):
+        if not s:
+            return
+        if prev is None:
+            parent.text = (parent.text or "") + s
+        else:
+            prev.tail = (prev.tail or "") + s
+
+    kids = list(child) if keep_content else []
+    parent.remove(child)
+    add(child.text if keep_content else "")
+    for k, kid in enumerate(kids):
+        parent.insert(i + k, kid)
+    if kids:
+        kids[-1].tail = (kids[-1].tail or "") + (child.tail or "")
+    else:
+        add(child.tail)
+
+
+def _clean(el) -> None:
+    for child in list(el):
+        _clean(child)
+        child.tag = _local(child.tag)
+        if child.tag in DROP_TAGS:
+            _unwrap(el, child, keep_content=False)
+        elif child.tag not in ALLOWED_TAGS or child.tag == "speak":
+            _unwrap(el, child)
+        elif child.tag == "mark" and child.get("name") == "END":
+            _unwrap(el, child)  # re-added once, at the very end
+        elif child.tag == "break" and child.get("time") and not _BREAK_TIME.match(child.get("time")):
+            child.set("time", f"{SENTENCE_BREAK_MS}ms")
+
+
+def _repair(ssml: str) -> str:
+    text = _DECL.sub("", _FENCE.sub("", (ssml or "").strip())).strip()
+    lo = text.lower()
+    start, end = lo.find("<speak"), lo.rfind("</speak>")
+    if start >= 0 and end > start:
+        text = text[start:end + len("</speak>")]
+    elif start >= 0:
+        text = text[start:]
+    else:
+        text = f"<speak>{text}</speak>"
+    text = _balance(_BARE_LT.sub("&lt;", _BARE_AMP.sub("&amp;", text)))
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError:
+        return ""
+    if _local(root.tag) != "speak":
+        return ""
+    root.tag = "speak"
+    root.attrib.pop("xmlns", None)
+    _clean(root)
+    ET.SubElement(root, "mark", name="END")
+    return ET.tostring(root, encoding="unicode")
+
+
+def repair_ssml(ssml: str, paragraph: str = "") -> tuple:
+    """
+    (ssml, outcome) where outcome is "valid" (returned untouched), "repaired" (fixed
+    locally), "rebuilt" (unrepairable, rebuilt from the paragraph) or "failed".
+    """
+    if not validate_ssml(ssml):
+        return ssml, "valid"
+    fixed = _repair(ssml)
+    if fixed and not validate_ssml(fixed):
+        return fixed, "repaired"
+    if (paragraph or "").strip():
+        return build_ssml(paragraph), "rebuilt"
+    return fixed, "failed"
+
+
+# ---------------------------------------------------------------- repair-rate metrics
+OUTCOMES = ("valid", "repaired", "rebuilt", "failed")
+GLOBAL_KEY = "hmva:ssml:stats"
+_job: ContextVar = ContextVar("ssml_job", default=None)
+
+
+def _job_key(job_id) -> str:
+    return f"hmva:ssml:{job_id}"
+
+
+@contextmanager
+def ssml_job(job_id):
+    """Attribute per-row outcomes inside the block to `job_id` (asyncio tasks inherit it)."""
+    token = _job.set(str(job_id) if job_id else None)
+    try:
+        yield
+    finally:
+        _job.reset(token)
+
+
+def current_job():
+    return _job.get()
+
+
+def _record(outcome: str) -> None:
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline()
+        keys = [GLOBAL_KEY] + ([_job_key(_job.get())] if _job.get() else [])
+        for key in keys:
+            pipe.hincrby(key, outcome, 1)
+            pipe.expire(key, 7 * 24 * 3600)
+        pipe.execute()
+    except Exception:
+        logger.debug("ssml stats unavailable", exc_info=True)
+
+
+def check_ssml(ssml: str, paragraph: str = "") -> str:
+    """repair_ssml + count the outcome for the current job; returns the SSML to use."""
+    fixed, outcome = repair_ssml(ssml, paragraph)
+    if outcome != "valid":
+        logger.info(f"SSML {outcome}: {'; '.join(validate_ssml(ssml))[:200]}")
+    _record(outcome)
+    return fixed
+
+
+def ssml_stats(job_id=None) -> dict:
+    """Outcome counts and repair rate for a job (or across all jobs)."""
+    counts = dict.fromkeys(OUTCOMES, 0)
+    r = get_redis()
+    if r is not None:
+        try:
+            raw = r.hgetall(_job_key(job_id) if job_id else GLOBAL_KEY)
+            counts.update({k.decode(): int(v) for k, v in raw.items()})
+        except Exception:
+            logger.debug("ssml stats unavailable", exc_info=True)
+    checked = sum(counts.values())
+    fixed = counts["repaired"] + counts["rebuilt"]
+    return {**counts, "checked": checked, "repair_rate": round(fixed / checked, 4) if checked else 0.0}
@@ -1,25 +1,51 @@
 # core/tasks.py
 from __future__ import annotations
 
-import os
 import io
-import uuid
-import json
+import csv
+import asyncio
+import time
 import logging
 import datetime
 from typing import Dict, Iterable, List, Optional
 
-import pandas as pd
-import requests
-from celery import shared_task, group, chord, chain
+import httpx
+from celery import shared_task, group, chain
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.utils import timezone
-from openpyxl import Workbook, load_workbook
 from requests.exceptions import HTTPError
 
-from core.jobs import job_get_or_create, job_set_state, job_touch
-from core.models import ScriptRequest, PublishTarget
+from core.jobs import (
+    job_get_or_create,
+    job_set_state,
+    job_touch,
+    job_mark_rows,
+    job_done_rows,
+    job_record_progress,
+    job_spool_rows,
+    job_claim_batches,
+    job_settle_queued,
+    job_seal_dispatch,
+    job_store_outputs,
+    job_load_rows,
+    row_fingerprint,
+    job_register_duplicates,
+    job_fan_out,
+    job_fill_duplicates,
+    iter_unsharded_rows,
+)
+from core.results import (
+    results_rel as results_rel_for,
+    shards_rel,
+    write_batch_shard,
+    merge_shards_to_xlsx,
+    next_run,
+)
+from core.batching import record_batch
+from core.ssml import ssml_job
+from core.schemas import parse_structured, record as record_structured
+from core.models import ScriptRequest, PublishTarget, JobRun, JobRow
 from core.prompts import (
     GENERATOR_SYSTEM,
     gen_user,
@@ -28,7 +54,9 @@ from core.prompts import (
     captions_user,
 )
 from core.services.tts_service import fetch_or_create_tts_audio, load_audio_bytes
+from core.services import sheets_writeback, openai_batch, llm_cache
 from core.adapters import (
+    transport,
     tts_elevenlabs,
     avatar_heygen,
     renderer_shotstack,
@@ -44,57 +72,18 @@ from core import utils
 from core.utils import (
     build_prompt,
     parse_openai_json,
+    build_packed_prompt,
+    parse_packed_json,
     call_openai_for_paragraph_and_ssml,
+    acall_openai_for_paragraph_and_ssml,
+    ask_structured,
+    aask_structured,
+    call_failed,
     iter_rows_streaming,
 )
 
-# ---- Google Sheets helpers
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-
 logger = logging.getLogger(__name__)
 
-RESULTS_DIR = "uploads/results"  
-
-# ====================== Small helpers ======================
-
-def _a1_col(n: int) -> str:
-    """1 -> A, 26 -> Z, 27 -> AA ..."""
-    s = ""
-    while n:
-        n, r = divmod(n - 1, 26)
-        s = chr(65 + r) + s
-    return s
-
-def _sheets_client():
-    sa_path = os.environ.get("GOOGLE_SA_JSON") or getattr(settings, "GOOGLE_SA_JSON", None)
-    if not sa_path:
-        raise RuntimeError("GOOGLE_SA_JSON is not set for Google Sheets write-back.")
-    creds = Credentials.from_service_account_file(sa_path, scopes=["https://www.googleapis.com/auth/spreadsheets"])
-    return build("sheets", "v4", credentials=creds).spreadsheets()
-
-def _ensure_sheet_headers_and_map(sheets, sheet_id: str, sheet_name: str, needed_cols: List[str]) -> Dict[str, int]:
-    """
-    Ensure 'needed_cols' appear in the first row. Return a 1-based name->index map.
-    """
-    head_resp = sheets.values().get(spreadsheetId=sheet_id, range=f"{sheet_name}!1:1").execute()
-    header = head_resp.get("values", [[]])
-    header = header[0] if header else []
-
-    changed = False
-    for col in needed_cols:
-        if col not in header:
-            header.append(col)
-            changed = True
-    if changed:
-        sheets.values().update(
-            spreadsheetId=sheet_id,
-            range=f"{sheet_name}!A1:{_a1_col(len(header))}1",
-            valueInputOption="RAW",
-            body={"values": [header]},
-        ).execute()
-
-    return {name: i + 1 for i, name in enumerate(header)}
 
 # ====================== Script & Render pipeline ======================
 
@@ -201,10 +190,13 @@ def task_generate_captions(sr_id: int):
     sr = ScriptRequest.objects.get(id=sr_id)
     hashtags = (sr.brand.hashtags or "").strip()
     hashtags_csv = hashtags if hashtags else ""
-    resp = utils.llm_chat(CAPTION_SYSTEM, captions_user(sr.icon_or_topic, hashtags_csv), 0.2)
-    try:
-        data = json.loads(resp)
-    except Exception:
+    resp = ask_structured(
+        lambda fresh: utils.llm_chat(CAPTION_SYSTEM, captions_user(sr.icon_or_topic, hashtags_csv), 0.2,
+                                     bypass_cache=fresh, schema="captions"),
+        "captions",
+    )
+    data = parse_structured(resp, "captions")
+    if data is None:
         data = {
             "caption_yt": resp[:180],
             "caption_tt": resp[:180],
@@ -389,38 +381,152 @@ def task_kickoff_chain(sr_id: int):
 
 
 
-def _abs_and_ensure_parent(relpath: str) -> str:
+def _row_result(row_dict: dict, paragraph: str, ssml: str) -> dict:
+    return {
+        "row": row_dict["row"],
+        "icon": (row_dict.get("icon") or "").strip(),
+        "category": (row_dict.get("category") or "").strip(),
+        "notes": (row_dict.get("notes") or "").strip(),
+        "paragraph": paragraph,
+        "ssml": ssml,
+    }
+
+
+def _generate_row(row_dict: dict) -> dict:
+    icon = (row_dict.get("icon") or "").strip()
+    category = (row_dict.get("category") or "").strip()
+    notes = (row_dict.get("notes") or "").strip()
+
+    prompt = build_prompt(icon=icon, notes=notes, category=category)
+    raw = ask_structured(lambda fresh: call_openai_for_paragraph_and_ssml(prompt, bypass_cache=fresh), "paragraph_ssml")
+    paragraph, ssml = parse_openai_json(raw)
+    return _row_result(row_dict, paragraph, ssml)
+
+
+def _generate_pack(rows: List[dict]) -> List[dict]:
+    """
+    One LLM call for the whole pack. Rows the answer is missing are retried on their
+    own: as a smaller pack if part of the answer parsed, split in half if none did,
+    down to the single-row prompt. A failed API call (429, outage) raises instead, so
+    the task's retry policy applies rather than the split multiplying the calls.
     """
-    Returns absolute path for a storage-relative file and ensures its parent dir exists.
-    Only for FileSystemStorage. (If you switch to S3, switch to BytesIO+default_storage.save.)
+    if len(rows) == 1:
+        return [_generate_row(rows[0])]
+
+    raw = call_openai_for_paragraph_and_ssml(build_packed_prompt(rows), schema="paragraph_ssml_packed")
+    if call_failed(raw):
+        raise RuntimeError(f"Packed call for {len(rows)} rows failed: {raw}")
+    parsed = parse_packed_json(raw)
+
+    done = [_row_result(r, *parsed[r["row"]]) for r in rows if r["row"] in parsed]
+    missing = [r for r in rows if r["row"] not in parsed]
+    record_structured("ok", len(done))
+    if not missing:
+        return done
+    record_structured("failed", len(missing))
+    record_structured("reasked", len(missing))
+
+    logger.warning(f"Packed call returned {len(done)}/{len(rows)} rows; retrying {len(missing)}")
+    if done:
+        return done + _generate_pack(missing)
+    mid = len(missing) // 2
+    return _generate_pack(missing[:mid]) + _generate_pack(missing[mid:])
+
+
+def _from_cache(results: List[dict], calls: list) -> List[dict]:
+    """Flag results as served from the LLM cache when no request inside llm_cache.api_calls() reached the API."""
+    if not calls[0]:
+        for r in results:
+            r["cached"] = True
+    return results
+
+
+def _by_reference(job_id: Optional[str], results: List[dict], started: Optional[float] = None) -> List[dict]:
     """
-    abs_path = default_storage.path(relpath)
-    parent = os.path.dirname(abs_path)
-    os.makedirs(parent, exist_ok=True)
-    return abs_path
+    Persist row outputs straight into JobRow and hand Celery only {"row": n}, so the
+    result backend holds row numbers rather than paragraphs (save_batch_task reads
+    the text back). Without a job_id the full dicts are returned as before.
+    With `started` (time.monotonic() when the task began) each reference also carries
+    its share of the task's execution time, which save_batch_task reports to the
+    adaptive batch sizer. Cache hits are flagged and get no share, so they do not
+    pull the per-row latency estimate down.
+    """
+    if not job_id:
+        return results
+    job_store_outputs(job_id, results)
+    live = sum(1 for r in results if not r.get("cached"))
+    share = (time.monotonic() - started) / live if started is not None and live else None
+    return [
+        {"row": r["row"], "cached": True} if r.get("cached")
+        else {"row": r["row"]} if share is None
+        else {"row": r["row"], "seconds": share}
+        for r in results
+    ]
+
 
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
-def process_row_task(self, row_dict: dict) -> dict:
+def process_row_task(self, row_dict: dict, job_id: Optional[str] = None) -> dict:
     """
     row_dict: {"row": int, "icon": str, "category": str, "notes": str}
-    Returns:  {"row", "icon", "category", "notes", "paragraph", "ssml"}
+    Returns:  {"row"} when job_id is given (output stored in JobRow),
+              else {"row", "icon", "category", "notes", "paragraph", "ssml"}
     """
+    started = time.monotonic()
+    with ssml_job(job_id), llm_cache.api_calls() as calls:
+        results = [_generate_row(row_dict)]
+    return _by_reference(job_id, _from_cache(results, calls), started)[0]
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def process_pack_task(self, rows: List[dict], job_id: Optional[str] = None) -> List[dict]:
+    """
+    Packed variant of process_row_task: K rows share one request and one copy
+    of the prompt instructions.
+    Returns a list of process_row_task-shaped dicts (one per input row).
+    """
+    started = time.monotonic()
+    with ssml_job(job_id), llm_cache.api_calls() as calls:
+        results = _generate_pack(rows)
+    return _by_reference(job_id, _from_cache(results, calls), started)
+
+
+async def _agenerate_row(row_dict: dict, client) -> dict:
     icon = (row_dict.get("icon") or "").strip()
     category = (row_dict.get("category") or "").strip()
     notes = (row_dict.get("notes") or "").strip()
 
     prompt = build_prompt(icon=icon, notes=notes, category=category)
-    raw = call_openai_for_paragraph_and_ssml(prompt)
+    raw = await aask_structured(
+        lambda fresh: acall_openai_for_paragraph_and_ssml(prompt, client, bypass_cache=fresh), "paragraph_ssml"
+    )
     paragraph, ssml = parse_openai_json(raw)
+    return _row_result(row_dict, paragraph, ssml)
 
-    return {
-        "row": row_dict["row"],
-        "icon": icon,
-        "category": category,
-        "notes": notes,
-        "paragraph": paragraph,
-        "ssml": ssml,
-    }
+
+async def _run_batch_async(rows: List[dict], concurrency: int) -> List[dict]:
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(120.0, connect=10.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def one(row: dict) -> dict:
+            async with sem:
+                # each gather task runs in its own context copy, so the count is per row
+                with llm_cache.api_calls() as calls:
+                    result = await _agenerate_row(row, client)
+                return _from_cache([result], calls)[0]
+        return list(await asyncio.gather(*(one(r) for r in rows)))
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def process_batch_async_task(self, rows: List[dict], concurrency: int = 16, job_id: Optional[str] = None) -> List[dict]:
+    """
+    Asyncio engine: one task per batch, its LLM calls run concurrently
+    (up to `concurrency` in flight) on a single httpx.AsyncClient.
+    Returns the same list of row dicts a group of process_row_task would.
+    """
+    started = time.monotonic()
+    with ssml_job(job_id):
+        return _by_reference(job_id, asyncio.run(_run_batch_async(rows, max(1, int(concurrency)))), started)
 
 
 @shared_task(bind=True)
@@ -433,13 +539,17 @@ def save_batch_task(
     mode: Optional[str] = None,
     sheet_id: Optional[str] = None,
     sheet_name: Optional[str] = None,
+    run: int = 0,
+    windowed: bool = False,
 ) -> dict:
     """
-    Appends batch_results to an XLSX file (always),
+    Writes batch_results to a per-batch JSONL shard (always),
     and optionally writes back to Google Sheets.
+    The final XLSX is assembled from the shards by finalize_job_task.
     Accepts either:
       - list[dict]  (normal chord header with N>1)
       - dict        (some brokers optimize single-header chord to a single item)
+    Items may be full row dicts or {"row": n} references to outputs already in JobRow.
     """
     # --- Coerce chord header result to list if needed ---
     if isinstance(batch_results, dict):
@@ -453,61 +563,183 @@ def save_batch_task(
                 f"save_batch_task expected list or dict for batch_results, got {type(batch_results).__name__}: {batch_results!r}"
             )
 
+    # Packed headers return a list of rows per task -> flatten
+    flat = []
+    for item in batch_results:
+        if isinstance(item, list):
+            flat.extend(item)
+        else:
+            flat.append(item)
+    batch_results = flat
+
     # Ensure every item is a dict
     for i, item in enumerate(batch_results):
         if not isinstance(item, dict):
             raise TypeError(f"batch_results[{i}] must be dict, got {type(item).__name__}: {item!r}")
 
+    # execution time the header tasks reported (not queue wait), for the adaptive sizer;
+    # rows answered from the LLM cache are left out of both the time and the row count
+    seconds = sum(float(item.pop("seconds", 0) or 0) for item in batch_results)
+    cached = sum(1 for item in batch_results if item.pop("cached", False))
+
+    # Row tasks pass results by reference ({"row": n}); the text is read back from JobRow
+    refs = [item["row"] for item in batch_results if "paragraph" not in item]
+    if refs:
+        batch_results = [item for item in batch_results if "paragraph" in item] + job_load_rows(job_id, refs)
+
     # Sort for deterministic append order
     batch_results = sorted(batch_results, key=lambda x: x.get("row", 0))
 
-    # ---- 1) Append to results workbook
-    abs_results = _abs_and_ensure_parent(results_path)
-    if not os.path.exists(abs_results):
-        wb = Workbook(); ws = wb.active
-        ws.append(["row", "icon", "category", "notes", "paragraph", "ssml"])
-    else:
-        wb = load_workbook(abs_results); ws = wb.active
+    # ---- 1) Write this batch as its own shard (merged once in finalize_job_task)
+    write_batch_shard(job_id, batch_no, batch_results, run=run)
+    # duplicates of these rows get the same output (they live in JobRow only, not in shards)
+    fanned = job_fan_out(job_id, batch_results)
+    done, failed = job_mark_rows(job_id, batch_results + fanned)
+    job_record_progress(job_id, done, failed)
+    if seconds:
+        record_batch(
+            job_id, len(batch_results) - cached,
+            sum(1 for r in batch_results if not (r.get("paragraph") or "").strip()),
+            seconds,
+        )
 
-    for item in batch_results:
-        ws.append([
-            item.get("row", ""),
-            item.get("icon", ""),
-            item.get("category", ""),
-            item.get("notes", ""),
-            item.get("paragraph", ""),
-            item.get("ssml", ""),
-        ])
-    wb.save(abs_results)
-
-    # ---- 2) Optional Google Sheet write-back
+    # ---- 2) Optional Google Sheet write-back (buffered; coalesced ranges per flush)
     if (mode or "").lower() == "google_sheet" and sheet_id and sheet_name and batch_results:
         try:
-            sheets = _sheets_client()
-            colmap = _ensure_sheet_headers_and_map(sheets, sheet_id, sheet_name, ["Paragraph", "SSML"])
-            p_col, s_col = colmap["Paragraph"], colmap["SSML"]
-            data = []
-            for item in batch_results:
-                rownum = int(item.get("row") or 0)
-                if rownum < 2: continue
-                p = (item.get("paragraph") or "").strip()
-                s = (item.get("ssml") or "").strip()
-                data.append({"range": f"{sheet_name}!{_a1_col(p_col)}{rownum}", "values": [[p]]})
-                data.append({"range": f"{sheet_name}!{_a1_col(s_col)}{rownum}", "values": [[s]]})
-            if data:
-                sheets.values().batchUpdate(
-                    spreadsheetId=sheet_id,
-                    body={"valueInputOption": "RAW", "data": data},
-                ).execute()
+            sheets_writeback.buffer_rows(job_id, sheet_id, sheet_name, batch_results + fanned)
         except Exception as e:
             logger.exception(f"Google Sheet write-back failed: {e}")
 
-    logger.info(f"[Batch {batch_no}] Saved {len(batch_results)} rows to {results_path}")
+    logger.info(f"[Batch {batch_no}] Saved {len(batch_results)} rows to {shards_rel(job_id)}")
+    if windowed:
+        _refill_window(job_id, finished=batch_no, run=run)
     return {"saved_batch": batch_no, "count": len(batch_results)}
 
 
+@shared_task
+def release_batch_slot(
+    request, exc, traceback, job_id: str = "", batch_no: int = 0, run: int = 0, rows: Optional[List[int]] = None
+):
+    """
+    Errback of a batch: a row task or the save failed for good. Settles the batch's
+    unsaved rows (DONE if their output was already stored, else FAILED), writes its
+    shard from JobRow so the rows still reach the workbook, and frees its slot so the
+    window keeps moving. May fire more than once per batch (one per failed header
+    task); the shard is rewritten each time, the slot only freed the first time.
+    """
+    rows = rows or []
+    done, failed = job_settle_queued(job_id, rows)
+    logger.error(f"[Job {job_id}] batch {batch_no} lost ({exc!r}); {done} row(s) kept, {failed} failed")
+    try:
+        write_batch_shard(job_id, batch_no, job_load_rows(job_id, rows), run=run)
+    except Exception:
+        # finalize_job_task still merges FAILED rows from JobRow
+        logger.exception(f"[Job {job_id}] could not write the shard of lost batch {batch_no}")
+    _refill_window(job_id, finished=batch_no, run=run)
+
+
+SPOOL_ROWS = 1000  # rows written to JobRow per insert while a job ingests
+
+
+def _job_mode(mode: Optional[str]) -> str:
+    return "google_sheet" if (mode or "").lower() == "google_sheet" else "local_file"
+
+
+def _chunker(it: Iterable[Dict], n: int) -> Iterable[List[Dict]]:
+    buf: List[Dict] = []
+    for item in it:
+        buf.append(item)
+        if len(buf) == n:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def _batch_chain(job_id: str, batch_no: int, rows: List[Dict], params: Dict, run: int):
+    """
+    header (row / packed / asyncio tasks) -> save_batch_task for one batch.
+    engine="batch" has no header: the provider batch already stored the outputs in
+    JobRow, so save_batch_task gets the rows by reference.
+    """
+    engine = (params.get("engine") or "").lower()
+    pack_size = int(params.get("pack_size") or 1)
+    save_kwargs = dict(
+        job_id=job_id,
+        batch_no=batch_no,
+        results_path=results_rel_for(job_id),
+        mode=_job_mode(params.get("mode")),
+        sheet_id=params.get("sheet_id"),
+        sheet_name=(params.get("sheet_name") or "Sheet1"),
+        run=run,
+        windowed=True,
+    )
+    errback = release_batch_slot.s(job_id=job_id, batch_no=batch_no, run=run, rows=[r["row"] for r in rows])
+    if engine == "batch":
+        return save_batch_task.s([{"row": r["row"]} for r in rows], **save_kwargs).on_error(errback)
+
+    if engine == "asyncio":
+        header = process_batch_async_task.s(rows, int(params.get("concurrency") or 16), job_id=job_id)
+    elif pack_size > 1:
+        header = group(process_pack_task.s(pack, job_id=job_id) for pack in _chunker(rows, pack_size))
+    else:
+        header = group(process_row_task.s(row, job_id=job_id) for row in rows)
+    # on the whole chain: a failed header must free the slot too, and a single asyncio
+    # task is a plain chain, where the save's errback would never be called
+    return chain(header, save_batch_task.s(**save_kwargs)).on_error(errback)
+
+
+def _refill_window(job_id: str, finished: Optional[int] = None, run: Optional[int] = None) -> None:
+    """Free the slot of batch `finished`, send whatever batches fit the window, finalize when drained."""
+    job, claimed, finalize_id = job_claim_batches(job_id, finished, run)
+    params = job.params or {}
+    for batch_no, rows in claimed:
+        _batch_chain(job_id, batch_no, rows, params, job.run).apply_async()
+    if finalize_id:
+        finalize_job_task.apply_async(
+            args=(None, job_id, results_rel_for(job_id), _job_mode(params.get("mode"))),
+            task_id=finalize_id, queue="default",
+        )
+
+
+@shared_task
+def poll_openai_batches_task() -> int:
+    """
+    Beat task for engine="batch": check every job waiting on provider batches, store
+    finished output into JobRow, and hand fully answered jobs to the windowed
+    save / finalize flow. Returns how many jobs were released.
+    """
+    released = 0
+    for job in JobRun.objects.filter(dispatch_state="BATCHING"):
+        job_id = str(job.job_id)
+        try:
+            if not openai_batch.poll(job):
+                continue
+        except Exception as e:
+            logger.exception(f"[Job {job_id}] Provider batch poll failed: {e}")
+            continue
+        # only one poller moves the job on, even if two beat ticks overlap
+        if JobRun.objects.filter(job_id=job_id, dispatch_state="BATCHING").update(dispatch_state="SEALED"):
+            logger.info(f"[Job {job_id}] Provider batches complete; saving")
+            _refill_window(job_id)
+            released += 1
+    return released
+
+
 @shared_task(bind=True)
 def finalize_job_task(self, prior_results, job_id: str, results_rel: str, mode: str) -> dict:
+    filled = job_fill_duplicates(job_id)
+    rows = merge_shards_to_xlsx(job_id, results_rel, extra=iter_unsharded_rows(job_id))
+    logger.info(f"[Job {job_id}] Merged {rows} rows into {results_rel}")
+    if (mode or "").lower() == "google_sheet":
+        try:
+            if filled:
+                params = JobRun.objects.filter(job_id=job_id).values_list("params", flat=True).first() or {}
+                if params.get("sheet_id"):
+                    sheets_writeback.buffer_rows(job_id, params["sheet_id"], params.get("sheet_name") or "Sheet1", filled)
+            sheets_writeback.flush(job_id, force=True)
+        except Exception as e:
+            logger.exception(f"Google Sheet final write-back failed: {e}")
     try:
         download_url = default_storage.url(results_rel)
     except Exception:
@@ -528,50 +760,93 @@ def orchestrate_paragraphs_job(
     sheet_public_url: Optional[str] = None,
     sheet_id: Optional[str] = None,
     sheet_name: Optional[str] = None,
+    pack_size: int = 1,
+    engine: str = "celery",
+    concurrency: int = 16,
+    resume_job_id: Optional[str] = None,
+    adaptive: bool = False,
+    window: int = 0,
 ) -> dict:
-    job_id = str(self.request.id)
+    """
+    window > 0 bounds the job to that many batches in flight: rows are spooled into
+    JobRow as QUEUED while the sheet is read, and every saved batch pulls the next one
+    (job_claim_batches), so broker load and orchestrator memory do not grow with the
+    sheet. window=0 sends every batch as soon as its rows are read.
+    adaptive=True treats batch_size as a starting point and re-picks the size for every
+    batch from observed row latency, error rate and io-queue backlog (core.batching);
+    the sizes used are recorded on JobRun.batch_sizes.
+    pack_size > 1 enables packed mode: each header task sends pack_size rows
+    in one LLM request (process_pack_task) instead of one request per row.
+    engine="asyncio" sends each batch to one process_batch_async_task that keeps
+    up to `concurrency` requests in flight, instead of one Celery task per row.
+    engine="batch" is the offline path for very large jobs: every row goes into
+    provider batch files (OpenAI Batch API, core.services.openai_batch) and nothing is
+    dispatched until poll_openai_batches_task finds the batches finished.
+    resume_job_id continues an earlier job: rows already checkpointed DONE are
+    skipped and only the remainder is dispatched, as a new shard run.
+    """
+    job_id = resume_job_id or str(self.request.id)
+    params = {
+        "file_path": file_path, "sheet": sheet, "batch_size": batch_size, "mode": mode,
+        "sheet_public_url": sheet_public_url, "sheet_id": sheet_id, "sheet_name": sheet_name,
+        "pack_size": pack_size, "engine": engine, "concurrency": concurrency, "adaptive": adaptive,
+        "window": window,
+    }
 
     # Create JobRun immediately
-    job_get_or_create(job_id, mode=mode, file_path=(file_path or ""), sheet_name=(sheet or sheet_name or ""))
+    job_get_or_create(job_id, mode=mode, file_path=(file_path or ""), sheet_name=(sheet or sheet_name or ""), params=params)
     job_set_state(job_id, state="RUNNING")
 
-    # Prep results workbook
-    results_rel = f"{RESULTS_DIR}/{job_id}.xlsx"
-    wb = Workbook()
-    ws = wb.active
-    ws.append(["row", "icon", "category", "notes", "paragraph", "ssml"])
-    abs_results = _abs_and_ensure_parent(results_rel)
-    wb.save(abs_results)
+    done_rows = job_done_rows(job_id) if resume_job_id else set()
+    run = next_run(job_id) if resume_job_id else 0
+    if resume_job_id:
+        logger.info(f"[Job {job_id}] Resuming as run {run}; skipping {len(done_rows)} completed rows")
+    # Progress counters describe the whole sheet; a resume starts from what is already done
+    job_touch(
+        job_id, started_at=timezone.now(), last_progress_at=None, rows_per_minute=0.0,
+        rows_total=0, rows_done=len(done_rows), rows_failed=JobRow.objects.filter(job_id=job_id, state="FAILED").count(),
+    )
+
+    # Results workbook is written once by finalize_job_task from the batch shards
+    results_rel = results_rel_for(job_id)
 
     # --- Row sources ---
     def google_sheet_rows() -> Iterable[Dict]:
         if not sheet_public_url:
             raise ValueError("sheet_public_url is required for mode='google_sheet'")
-        resp = requests.get(sheet_public_url, timeout=30)
-        resp.raise_for_status()
-        df = pd.read_csv(io.StringIO(resp.text))
-        cols_lower = {c.lower().strip(): c for c in df.columns}
-
-        def pick(*cands):
-            for c in cands:
-                if c in cols_lower:
-                    return cols_lower[c]
-            return None
-
-        col_icon = pick("icon name", "icon", "name")
-        col_cat = pick("category")
-        col_notes = pick("notes", "note", "description")
-        if not (col_icon or col_cat or col_notes):
-            raise ValueError("CSV is missing required columns: (Icon Name | Category | Notes)")
-
-        for idx, r in df.iterrows():
-            sheet_rownum = idx + 2
-            icon = str(r.get(col_icon, "")).strip() if col_icon else ""
-            cat = str(r.get(col_cat, "")).strip() if col_cat else ""
-            notes = str(r.get(col_notes, "")).strip() if col_notes else ""
-            if not (icon or cat or notes):
-                continue
-            yield {"row": sheet_rownum, "icon": icon, "category": cat, "notes": notes}
+        # Parse the CSV export as it downloads: the first rows are yielded (and batched)
+        # while the rest of the body is still on the wire, with flat memory.
+        resp = transport.get(sheet_public_url, timeout=30, stream=True)
+        try:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            reader = csv.reader(io.TextIOWrapper(resp.raw, encoding="utf-8-sig", newline=""))
+            header = next(reader, None) or []
+            cols_lower = {c.lower().strip(): i for i, c in enumerate(header)}
+
+            def pick(*cands):
+                for c in cands:
+                    if c in cols_lower:
+                        return cols_lower[c]
+                return None
+
+            col_icon = pick("icon name", "icon", "name")
+            col_cat = pick("category")
+            col_notes = pick("notes", "note", "description")
+            if col_icon is None and col_cat is None and col_notes is None:
+                raise ValueError("CSV is missing required columns: (Icon Name | Category | Notes)")
+
+            def cell(rec, i):
+                return rec[i].strip() if i is not None and i < len(rec) else ""
+
+            # one CSV record per sheet row; the header is row 1
+            for sheet_rownum, rec in enumerate(reader, start=2):
+                icon, cat, notes = cell(rec, col_icon), cell(rec, col_cat), cell(rec, col_notes)
+                if not (icon or cat or notes):
+                    continue
+                yield {"row": sheet_rownum, "icon": icon, "category": cat, "notes": notes}
+        finally:
+            resp.close()
 
     def local_file_rows() -> Iterable[Dict]:
         if not file_path:
@@ -588,55 +863,79 @@ def orchestrate_paragraphs_job(
     else:
         row_iter = local_file_rows()
         mode = "local_file"
+    if done_rows:
+        row_iter = (r for r in row_iter if r["row"] not in done_rows)
+
+    # In-job dedup: only the first row with a given (icon, category, notes) is generated;
+    # later copies are recorded against it and filled from its result when it is saved.
+    first_row_for: Dict[str, int] = {}
+    dup_buf: List[tuple] = []
+    deduped = 0
+
+    def unique_rows(it: Iterable[Dict]) -> Iterable[Dict]:
+        nonlocal deduped
+        for r in it:
+            canon = first_row_for.setdefault(row_fingerprint(r), r["row"])
+            if canon == r["row"]:
+                yield r
+                continue
+            deduped += 1
+            dup_buf.append((r, canon))
+            if len(dup_buf) >= 1000:
+                job_register_duplicates(job_id, dup_buf)
+                dup_buf.clear()
+
+    row_iter = unique_rows(row_iter)
+
+    # Rows are spooled into JobRow as QUEUED while the source is read; batches are cut
+    # from them and sent right away (up to `window` in flight). Completion is counted on
+    # JobRun (job_claim_batches): the batch that leaves nothing queued or in flight after
+    # the seal sends finalize_job_task, so no chord spans the whole job.
+    offline = (engine or "").lower() == "batch"
+    job_touch(job_id, dispatch_state="INGESTING", inflight=0, dispatch_cursor=0, batches=0, run=run,
+              released_batches=[], results_path=results_rel, batch_sizes=[], provider_batches=[])
+    total_rows = len(done_rows)
+    for rows in _chunker(row_iter, SPOOL_ROWS):
+        job_spool_rows(job_id, rows)
+        total_rows += len(rows)
+        job_touch(job_id, rows_total=total_rows + deduped)
+        if not offline:
+            _refill_window(job_id)  # batches start while the sheet is still being read
+        self.update_state(state="PROGRESS", meta={"spooled_rows": total_rows, "mode": mode})
+    if dup_buf:
+        job_register_duplicates(job_id, dup_buf)
+    job_touch(job_id, rows_total=total_rows + deduped,
+              rows_deduped=JobRow.objects.filter(job_id=job_id, dup_of__isnull=False).count())
+    if deduped:
+        logger.info(f"[Job {job_id}] {deduped} duplicate row(s) will be filled from {len(first_row_for)} unique input(s)")
+
+    if offline:
+        # Parked until poll_openai_batches_task has every provider batch back
+        finalize_id = job_seal_dispatch(job_id, state="BATCHING")
+        batches = openai_batch.submit(job_id)
+        if not batches:
+            job_touch(job_id, dispatch_state="SEALED")
+            _refill_window(job_id)
+        return {
+            "job_id": job_id,
+            "handoff_id": finalize_id,
+            "results": results_rel,
+            "provider_batches": [b["id"] for b in batches],
+            "mode": mode,
+            "state": "SCHEDULED",
+            "jobs_url": "/api/jobs/",
+        }
 
-    # batching
-    def _chunker(it: Iterable[Dict], n: int) -> Iterable[List[Dict]]:
-        buf: List[Dict] = []
-        for item in it:
-            buf.append(item)
-            if len(buf) == n:
-                yield buf
-                buf = []
-        if buf:
-            yield buf
-
-    chains = []
-    total_batches = 0
-    for total_batches, rows in enumerate(_chunker(row_iter, batch_size), start=1):
-        header = group(process_row_task.s(row) for row in rows)
-        callback = save_batch_task.s(
-            job_id=job_id,
-            batch_no=total_batches,
-            results_path=results_rel,
-            mode=mode,
-            sheet_id=sheet_id,
-            sheet_name=(sheet_name or "Sheet1"),
-        )
-        chains.append(chain(header, callback))
-        self.update_state(state="PROGRESS", meta={"scheduled_batches": total_batches, "mode": mode})
+    # Seal: from here the last batch to finish (or this call, if none are left) finalizes
+    finalize_id = job_seal_dispatch(job_id)
+    _refill_window(job_id)
 
-    if not chains:
-        try:
-            download_url = default_storage.url(results_rel)
-        except Exception:
-            download_url = None
-        job_set_state(job_id, state="SUCCESS", results_path=results_rel, download_url=download_url)
-        return {"job_id": job_id, "results": results_rel, "download_url": download_url,
-                "batches": 0, "mode": mode, "state": "READY"}
-
-    # master chord -> finalize
-    final_cb = finalize_job_task.s(job_id, results_rel, mode).set(queue="default")
-    final_async = chord(group(*chains))(final_cb)
-    # Persist results path, batches, and **handoff_id** so status can follow it
-    job_touch(job_id, results_path=results_rel, batches=total_batches, handoff_id=final_async.id)
-
-    # Return metadata (unchanged contract)
     return {
         "job_id": job_id,
-        "handoff_id": final_async.id,
+        "handoff_id": finalize_id,
         "results": results_rel,
-        "batches": total_batches,
+        "window": window,
         "mode": mode,
         "state": "SCHEDULED",
         "jobs_url": "/api/jobs/",
-    }
\ No newline at end of file
+    }
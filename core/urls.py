@@ -1,6 +1,6 @@
 from django.urls import path
 
-from core.views_jobs import api_jobs_detail, api_jobs_list
+from core.views_jobs import api_jobs_detail, api_jobs_events, api_jobs_export, api_jobs_list, api_jobs_resume
 from .views import (
   job_results, api_tts_elevenlabs, job_status  , heygen_avatars_api, heygen_voices_api, icon_meta_api, script_avatar_page, script_avatar_page, script_form, ParagraphAPI, request_detail
 )
@@ -24,6 +24,9 @@ urlpatterns = [
     path("api/jobs/<uuid:job_id>/status/", job_status, name="job-status"),
     path("api/jobs/<uuid:job_id>/results/", job_results, name="api-job-results"),
     path("api/jobs/", api_jobs_list, name="api-jobs-list"),
+    path("api/jobs/<uuid:job_id>/resume/", api_jobs_resume, name="api-jobs-resume"),
+    path("api/jobs/<uuid:job_id>/events/", api_jobs_events, name="api-jobs-events"),
+    path("api/jobs/<uuid:job_id>/export/", api_jobs_export, name="api-jobs-export"),
     path("api/jobs/<str:job_id>/", api_jobs_detail, name="api-jobs-detail"),
 
 
@@ -1,19 +1,28 @@
 import json
 import re
 import datetime
-from typing import Dict
+from typing import Callable, Dict, Iterator, Optional
 from zoneinfo import ZoneInfo
 
-from core.adapters import llm_openai
-from core.prompts import BASE_SCRIPT_SYSTEM, PROMPT_TEMPLATE, base_script_user
+from django.conf import settings
+
+from core.services.llm_cache import cached_chat, acached_chat, cached_chat_stream
+from core.prompts import BASE_SCRIPT_SYSTEM, PROMPT_TEMPLATE, PACKED_PROMPT_TEMPLATE, STREAM_PROMPT_TEMPLATE, base_script_user
+from core.ssml import build_ssml, check_ssml
+from core.schemas import REASKS, SCHEMAS, matches, parse_structured, record, response_format
 
 
 
 def word_range(duration: str):
     return {"15s": (60,75), "30s": (90,120), "60s": (150,180)}.get(duration, (90,120))
 
-def llm_chat(system, user, temp=0.5):
-    return llm_openai.chat(system, user, temp)
+def llm_chat(system, user, temp=0.5, bypass_cache=False, schema=None, hedge=False):
+    """
+    schema: a core.schemas.SCHEMAS name to constrain the answer to (json_schema mode).
+    hedge: race a duplicate request against a slow one (interactive paths only).
+    """
+    return cached_chat(system, user, temp, bypass=bypass_cache,
+                       response_format=response_format(schema) if schema else None, hedge=hedge)
 
 def call_openai_for_ssml(prompt):
     """
@@ -40,7 +49,7 @@ def call_openai_for_ssml(prompt):
     """
     user = prompt
     try:
-        ssml = llm_openai.chat(system, user, temperature=0.2)
+        ssml = llm_chat(system, user, temp=0.2)
         return ssml
     except Exception as e:
         return f"Error: {str(e)}"
@@ -85,7 +94,7 @@ def next_post_slot(brand_timezone: str, post_windows_csv: str):
 # core/utils.py (append at bottom or near your other llm helpers)
 import re
 
-def generate_heritage_paragraph(icon_name: str, notes: str) -> str:
+def generate_heritage_paragraph(icon_name: str, notes: str, bypass_cache: bool = False) -> str:
     """
     Generates a single 100–130 word paragraph per the Instructional Notes.
     Uses llm_chat(BASE_SCRIPT_SYSTEM, base_script_user, temperature=0.5).
@@ -93,7 +102,7 @@ def generate_heritage_paragraph(icon_name: str, notes: str) -> str:
     """
     from .prompts import BASE_SCRIPT_SYSTEM, base_script_user
 
-    raw = llm_chat(BASE_SCRIPT_SYSTEM, base_script_user(icon_name, notes), temp=0.5)
+    raw = llm_chat(BASE_SCRIPT_SYSTEM, base_script_user(icon_name, notes), temp=0.5, bypass_cache=bypass_cache, hedge=True)
 
     # normalize whitespace to keep one paragraph
     text = raw.strip()
@@ -114,7 +123,7 @@ def generate_heritage_paragraph(icon_name: str, notes: str) -> str:
             f"no emojis, no em dashes, standard punctuation only. Icon: {icon_name}. Notes: {notes}. "
             f"ORIGINAL:\n{text}\n\nReturn only the corrected paragraph."
         )
-        text = llm_chat("You are a precise editor.", fix_prompt, temp=0.3).strip()
+        text = llm_chat("You are a precise editor.", fix_prompt, temp=0.3, bypass_cache=bypass_cache, hedge=True).strip()
         text = re.sub(r'\s*\n+\s*', ' ', text)
         text = re.sub(r'\s{2,}', ' ', text).strip()
     return text
@@ -139,12 +148,57 @@ def build_prompt(icon: str, notes: str = "", category: str | None = None) -> str
     lo, hi = word_range_for_duration(duration)
     return PROMPT_TEMPLATE.format(icon=icon_for_prompt, notes=(notes or "").strip(), lo=lo, hi=hi)
 
-def parse_openai_json(raw: str) -> tuple[str, str]:
+def build_packed_prompt(rows: list[dict]) -> str:
+    """
+    One prompt for several sheet rows; each item keeps its sheet row number so
+    the answers can be matched back even if the model reorders them.
+    """
+    lo, hi = word_range_for_duration("30")
+    items = "\n".join(
+        json.dumps({
+            "row": r["row"],
+            "icon": compose_icon_for_prompt(r.get("icon", ""), r.get("category", "")),
+            "notes": (r.get("notes") or "").strip() or "none",
+        }, ensure_ascii=False)
+        for r in rows
+    )
+    return PACKED_PROMPT_TEMPLATE.format(count=len(rows), items=items, lo=lo, hi=hi)
+
+
+def parse_packed_json(raw: str) -> dict[int, tuple[str, str]]:
+    """
+    Returns {row: (paragraph, ssml)} for every usable entry of a packed answer.
+    Rows that are missing, malformed or have an empty paragraph are left out,
+    so the caller can retry only those.
+    """
     try:
-        data = json.loads(raw)
-        return str(data.get("paragraph", "")), str(data.get("ssml", ""))
-    except Exception:
-        return (raw or ""), ""
+        data = json.loads(raw or "")
+    except ValueError:
+        data = None
+    items = data.get("results") if isinstance(data, dict) else None
+    # items are checked one by one so a single broken entry doesn't sink the pack
+    item_schema = SCHEMAS["paragraph_ssml_packed"]["properties"]["results"]["items"]
+    out: dict[int, tuple[str, str]] = {}
+    for it in items if isinstance(items, list) else []:
+        if not matches(it, item_schema):
+            continue
+        row = it["row"]
+        paragraph = it["paragraph"].strip()
+        if paragraph:
+            out[row] = (paragraph, check_ssml(it["ssml"].strip(), paragraph))
+    return out
+
+def parse_openai_json(raw: str) -> tuple[str, str]:
+    """
+    (paragraph, ssml) from a paragraph_ssml answer; the SSML is validated and repaired
+    (or rebuilt) locally. ("", "") when the answer doesn't match the schema, so the row
+    is re-asked or checkpointed FAILED instead of storing the raw text as its paragraph.
+    """
+    data = parse_structured(raw, "paragraph_ssml")
+    paragraph = data["paragraph"].strip() if data else ""
+    if not paragraph:
+        return "", ""
+    return paragraph, check_ssml(data["ssml"].strip(), paragraph)
 
 def iter_rows_streaming(file_like_or_path, sheet=None):
     """
@@ -227,17 +281,24 @@ def batch(iterable, size: int):
         yield buf
 
 
-def call_openai_for_paragraph_and_ssml(prompt: str) -> str:
+PARAGRAPH_SSML_SYSTEM = (
+    "You are a senior fashion copywriter AND an SSML engineer.\n"
+    "Return ONLY a single JSON object (no extra commentary, no markdown)."
+)
+
+PARAGRAPH_STREAM_SYSTEM = "You are a senior fashion copywriter. Return ONLY the paragraph as plain text."
+
+
+def call_openai_for_paragraph_and_ssml(prompt: str, bypass_cache: bool = False, schema: str = "paragraph_ssml",
+                                      hedge: bool = False) -> str:
     """
     Calls OpenAI once with both paragraph + SSML instructions.
-    Returns raw JSON string (the model must output strictly JSON).
+    Returns raw JSON string, constrained to SCHEMAS[schema] ("paragraph_ssml_packed"
+    for packed prompts). Served from the LLM response cache unless bypass_cache=True.
     """
-    system = (
-        "You are a senior fashion copywriter AND an SSML engineer.\n"
-        "Return ONLY a single JSON object (no extra commentary, no markdown)."
-    )
     try:
-        raw = llm_openai.chat(system, prompt, temperature=0.2).strip()
+        raw = llm_chat(PARAGRAPH_SSML_SYSTEM, prompt, temp=0.2, bypass_cache=bypass_cache, schema=schema,
+                       hedge=hedge).strip()
         return raw
     except Exception as e:
         return json.dumps({
@@ -247,6 +308,69 @@ def call_openai_for_paragraph_and_ssml(prompt: str) -> str:
         })
 
 
+async def acall_openai_for_paragraph_and_ssml(prompt: str, client, bypass_cache: bool = False,
+                                              schema: str = "paragraph_ssml") -> str:
+    """Async call_openai_for_paragraph_and_ssml over a shared httpx.AsyncClient."""
+    try:
+        raw = await acached_chat(PARAGRAPH_SSML_SYSTEM, prompt, 0.2, client=client, bypass=bypass_cache,
+                                 response_format=response_format(schema))
+        return raw.strip()
+    except Exception as e:
+        return json.dumps({
+            "paragraph": "",
+            "ssml": "",
+            "error": str(e),
+        })
+
+
+def call_failed(raw: str) -> bool:
+    """True for the error stand-in the call_openai_* helpers return when the API call raised."""
+    try:
+        return bool(json.loads(raw).get("error"))
+    except Exception:
+        return False
+
+
+def _nonempty(data: Optional[dict], name: str) -> bool:
+    return data is not None and (name != "paragraph_ssml" or bool(data["paragraph"].strip()))
+
+
+def ask_structured(call: Callable[[bool], str], name: str) -> str:
+    """
+    Returns call(fresh)'s answer once it parses against SCHEMAS[name]. An answer that
+    doesn't is counted and re-asked up to REASKS times with fresh=True, since the LLM
+    cache would hand back the same broken answer. API errors are not re-asked here.
+    """
+    for attempt in range(REASKS + 1):
+        if attempt:
+            record("reasked")
+        raw = call(attempt > 0)
+        if _nonempty(parse_structured(raw, name), name):
+            record("ok")
+            return raw
+        if call_failed(raw):
+            return raw
+        record("failed")
+    record("exhausted")
+    return raw
+
+
+async def aask_structured(call, name: str) -> str:
+    """ask_structured for an async call(fresh)."""
+    for attempt in range(REASKS + 1):
+        if attempt:
+            record("reasked")
+        raw = await call(attempt > 0)
+        if _nonempty(parse_structured(raw, name), name):
+            record("ok")
+            return raw
+        if call_failed(raw):
+            return raw
+        record("failed")
+    record("exhausted")
+    return raw
+
+
 _WS_NEWLINES = re.compile(r'\s*\n+\s*')
 _MULTI_WS = re.compile(r'\s{2,}')
 
@@ -293,6 +417,7 @@ def generate_heritage_paragraph_with_ssml(
     duration: str,
     category: str | None = None,
     temp: float = 0.5,
+    bypass_cache: bool = False,
 ) -> Dict[str, str]:
     """
     Generates a single documentary-style paragraph (120–160 words) AND
@@ -306,13 +431,18 @@ def generate_heritage_paragraph_with_ssml(
 
     # raw = llm_chat(BASE_SCRIPT_SYSTEM, user_prompt, temp=temp)
     prompt = build_prompt(icon=icon_name, notes=notes, category=category)
-    raw = call_openai_for_paragraph_and_ssml(prompt)
-    data = _coerce_json(raw)
+    raw = ask_structured(
+        lambda fresh: call_openai_for_paragraph_and_ssml(prompt, bypass_cache=bypass_cache or fresh, hedge=True),
+        "paragraph_ssml",
+    )
+    # interactive path: rather a best-effort paragraph than nothing once re-asks run out
+    data = parse_structured(raw, "paragraph_ssml") or _coerce_json(raw)
 
     # Normalize and guard the paragraph
     paragraph = _normalize_one_paragraph(data.get("paragraph", ""))
 
     # If length drifts, nudge once
+    rewritten = False
     wc = len(paragraph.split())
     if wc < 120 or wc > 160:
         fix_prompt = (
@@ -323,28 +453,59 @@ def generate_heritage_paragraph_with_ssml(
             f"Original:\n{paragraph}\n\n"
             "Return only the corrected paragraph."
         )
-        paragraph = llm_chat("You are a precise editor.", fix_prompt, temp=0.3).strip()
+        paragraph = llm_chat("You are a precise editor.", fix_prompt, temp=0.3, bypass_cache=bypass_cache,
+                             hedge=True).strip()
         paragraph = _normalize_one_paragraph(paragraph)
+        rewritten = True
 
-    # SSML: accept model output if valid-looking, otherwise convert paragraph-only
+    # SSML: validate the model's output and repair it locally; only when it can't be
+    # repaired (or the paragraph was rewritten and the model's SSML no longer matches
+    # it) build it from the final paragraph. SSML_BUILDER="local" always builds.
     ssml = (data.get("ssml") or "").strip()
-    has_speak = ssml.lower().startswith("<speak") and ssml.lower().endswith("</speak>")
-
-    if not has_speak:
-        # Fallback: ask model to convert the finalized paragraph to SSML only
-        ssml_system = (
-            "You convert plain text into VALID, production-ready SSML (ElevenLabs-compatible). "
-            "Return ONE <speak> block ONLY. No code fences, no explanations, no XML declaration. "
-            'Wrap with <prosody rate="medium">…</prosody>. Use <break time="120ms"–"500ms">, '
-            '<emphasis level="moderate"> (≤3 uses), convert years with '
-            '<say-as interpret-as="date" format="y">YYYY</say-as> and integers with '
-            '<say-as interpret-as="cardinal">N</say-as>. Escape special characters. '
-            'End with <mark name="END"/> before </speak>.'
+    if rewritten or getattr(settings, "SSML_BUILDER", "fallback") == "local":
+        ssml = build_ssml(paragraph)
+    else:
+        ssml = check_ssml(ssml, paragraph)
+
+    return {"paragraph": paragraph, "ssml": ssml}
+
+
+def stream_heritage_paragraph_with_ssml(
+    icon_name: str,
+    notes: str,
+    category: str | None = None,
+    bypass_cache: bool = False,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Streaming variant of generate_heritage_paragraph_with_ssml for the interactive API.
+    Yields (event, data):
+      ("delta", {"text"})          paragraph tokens as the model produces them
+      ("paragraph", {"paragraph"}) the final paragraph (replaces the deltas if a length fix ran)
+      ("ssml", {"ssml"})           built locally from the final paragraph, no second LLM call
+    """
+    lo, hi = word_range_for_duration("30")
+    prompt = STREAM_PROMPT_TEMPLATE.format(
+        icon=compose_icon_for_prompt(icon_name, category), notes=(notes or "").strip() or "none", lo=lo, hi=hi,
+    )
+    parts = []
+    for delta in cached_chat_stream(PARAGRAPH_STREAM_SYSTEM, prompt, 0.2, bypass=bypass_cache):
+        parts.append(delta)
+        yield "delta", {"text": delta}
+    paragraph = _normalize_one_paragraph("".join(parts))
+
+    # same one-shot nudge as the blocking path, against the range the prompt asked for
+    wc = len(paragraph.split())
+    if paragraph and (wc < lo or wc > hi):
+        fix_prompt = (
+            f"Rewrite into one flowing paragraph of {lo}–{hi} words. "
+            "Keep meaning. No emojis, no em dashes, standard punctuation only.\n\n"
+            f"Icon: {icon_name}\nNotes: {notes or 'none'}\n"
+            f"Original:\n{paragraph}\n\n"
+            "Return only the corrected paragraph."
         )
-        ssml_user = (
-            "Convert the following paragraph to SSML following the rules:\n\n"
-            f"{paragraph}"
+        paragraph = _normalize_one_paragraph(
+            llm_chat("You are a precise editor.", fix_prompt, temp=0.3, bypass_cache=bypass_cache, hedge=True)
         )
-        ssml = llm_chat(ssml_system, ssml_user, temp=0.2).strip()
+    yield "paragraph", {"paragraph": paragraph}
+    yield "ssml", {"ssml": build_ssml(paragraph) if paragraph else ""}
 
-    return {"paragraph": paragraph, "ssml": ssml}
\ No newline at end of file
@@ -233,6 +233,8 @@ import json
 import uuid
 import requests
 from django.conf import settings
+from core.adapters import transport
+from core.ssml import repair_ssml, validate_ssml
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt  # not needed if you pass CSRF
@@ -259,6 +261,12 @@ def api_tts_elevenlabs(request):
     if not voice_id or not ssml:
         return HttpResponseBadRequest("Missing voice_id or ssml")
 
+    # Repair locally rather than let ElevenLabs reject (or misread) broken markup
+    fixed, outcome = repair_ssml(ssml)
+    if outcome == "failed":
+        return JsonResponse({"error": "invalid SSML", "problems": validate_ssml(ssml)}, status=400)
+    ssml = fixed
+
     api_key = getattr(settings, "ELEVENLABS_API_KEY", None)
     if not api_key:
         return JsonResponse({"error": "ELEVENLABS_API_KEY not configured"}, status=500)
@@ -292,7 +300,7 @@ def api_tts_elevenlabs(request):
 
 
     try:
-        r = requests.post(url, headers=headers, json=payload, stream=True, timeout=120)
+        r = transport.post(url, headers=headers, json=payload, stream=True, timeout=120)
         if r.status_code != 200:
             # Some orgs get 422 if SSML flag/field differs — include server message
             return JsonResponse({"error": f"ElevenLabs error {r.status_code}: {r.text}"}, status=400)
@@ -376,7 +384,8 @@ from rest_framework import status
 from rest_framework.parsers import MultiPartParser, JSONParser, FormParser
 
 # your generator
-from core.utils import generate_heritage_paragraph_with_ssml
+from core.utils import generate_heritage_paragraph_with_ssml, stream_heritage_paragraph_with_ssml
+from django.http import StreamingHttpResponse
 # your Celery orchestration task (must accept the kwargs used below)
 
 
@@ -390,6 +399,19 @@ def _is_xlsx_upload(name: str, content_type: Optional[str]) -> bool:
     return name_ok or ct_ok
 
 
+def _paragraph_events(icon: str, notes: str, category: str, no_cache: bool):
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    try:
+        for event, data in stream_heritage_paragraph_with_ssml(icon, notes, category, bypass_cache=no_cache):
+            yield sse(event, data)
+    except Exception as e:
+        yield sse("error", {"error": str(e)})
+        return
+    yield sse("done", {"icon": icon})
+
+
 class ParagraphAPI(APIView):
     """
     Modes (by 'action'):
@@ -397,7 +419,11 @@ class ParagraphAPI(APIView):
     A) action=upload_sheet  (multipart/form-data)
        - file: .xlsx (required)
        - sheet: optional (default 'Sheet1')
-       - batch_size: optional int (default 25)
+       - batch_size: optional int (default 25), or 'auto' to size batches adaptively
+       - pack_size: optional int (default 1); >1 sends that many rows per LLM request
+       - engine: optional 'celery' (one task per row, default), 'asyncio' (one task per batch)
+         or 'batch' (offline: OpenAI Batch API, results within 24h; for very large sheets)
+       - window: optional int (default 0 = all batches at once); max batches in flight
        -> Enqueues Celery orchestrator in mode='local_file'
        <- 202 { job_id, status:'queued', mode, file, sheet, batch_size, status_url }
 
@@ -405,12 +431,19 @@ class ParagraphAPI(APIView):
        - sheet_public_url (required, CSV export URL)
        - sheet_id (required)
        - sheet_name (default 'Sheet1')
-       - batch_size: optional int (default 25)
+       - batch_size: optional int (default 25) | 'auto'
+       - pack_size: optional int (default 1)
+       - engine: optional 'celery' | 'asyncio' | 'batch'
+       - window: optional int (default 0)
        -> Enqueues mode='google_sheet'
        <- 202 { job_id, status:'queued', ... , status_url }
 
     C) default: single generate now
        - icon (required), notes/category/duration (optional)
+       - no_cache: optional bool; skip the LLM response cache and regenerate
+       - stream: optional bool; answer as server-sent events instead:
+         'delta' {text} per paragraph token, then 'paragraph' {paragraph},
+         'ssml' {ssml} and 'done' (or 'error' {error})
        <- 200 { icon, data: { paragraph, ssml, ... } }
     """
     parser_classes = (MultiPartParser, JSONParser, FormParser)
@@ -428,12 +461,28 @@ class ParagraphAPI(APIView):
                 return Response({"error": "Please upload a valid .xlsx file"}, status=status.HTTP_400_BAD_REQUEST)
 
             sheet = request.data.get("sheet") or "Sheet1"
+            adaptive = str(request.data.get("batch_size", "")).strip().lower() == "auto"
             try:
-                batch_size = int(request.data.get("batch_size", 25))
+                batch_size = 25 if adaptive else int(request.data.get("batch_size", 25))
                 if batch_size <= 0:
                     raise ValueError
             except Exception:
-                return Response({"error": "batch_size must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"error": "batch_size must be a positive integer or 'auto'"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                pack_size = int(request.data.get("pack_size", 1))
+                if pack_size <= 0:
+                    raise ValueError
+            except Exception:
+                return Response({"error": "pack_size must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+            engine = (request.data.get("engine") or "celery").strip().lower()
+            if engine not in ("celery", "asyncio", "batch"):
+                return Response({"error": "engine must be 'celery', 'asyncio' or 'batch'"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                window = int(request.data.get("window", 0) or 0)
+                if window < 0:
+                    raise ValueError
+            except Exception:
+                return Response({"error": "window must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
 
             # Save file where workers can read it
             job_id = str(uuid.uuid4())
@@ -455,6 +504,10 @@ class ParagraphAPI(APIView):
                     "file_path": saved_path,
                     "sheet": sheet,           # IMPORTANT: pass 'sheet'
                     "batch_size": batch_size,
+                    "pack_size": pack_size,
+                    "engine": engine,
+                    "adaptive": adaptive,
+                    "window": window,
                 },
                 task_id=job_id,
             )
@@ -467,6 +520,10 @@ class ParagraphAPI(APIView):
                     "file": saved_path,
                     "sheet": sheet,
                     "batch_size": batch_size,
+                    "pack_size": pack_size,
+                    "engine": engine,
+                    "adaptive": adaptive,
+                    "window": window,
                     "status_url": f"/api/jobs/{task.id}/status/",
                 },
                 status=status.HTTP_202_ACCEPTED,
@@ -477,12 +534,28 @@ class ParagraphAPI(APIView):
             sheet_public_url = request.data.get("sheet_public_url")
             gs_id = request.data.get("sheet_id")
             sheet_name = request.data.get("sheet_name") or "Sheet1"
+            adaptive = str(request.data.get("batch_size", "")).strip().lower() == "auto"
             try:
-                batch_size = int(request.data.get("batch_size", 25))
+                batch_size = 25 if adaptive else int(request.data.get("batch_size", 25))
                 if batch_size <= 0:
                     raise ValueError
             except Exception:
-                return Response({"error": "batch_size must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"error": "batch_size must be a positive integer or 'auto'"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                pack_size = int(request.data.get("pack_size", 1))
+                if pack_size <= 0:
+                    raise ValueError
+            except Exception:
+                return Response({"error": "pack_size must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+            engine = (request.data.get("engine") or "celery").strip().lower()
+            if engine not in ("celery", "asyncio", "batch"):
+                return Response({"error": "engine must be 'celery', 'asyncio' or 'batch'"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                window = int(request.data.get("window", 0) or 0)
+                if window < 0:
+                    raise ValueError
+            except Exception:
+                return Response({"error": "window must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
             if not sheet_public_url or not gs_id:
                 return Response({"error": "sheet_public_url and sheet_id are required"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -504,6 +577,10 @@ class ParagraphAPI(APIView):
                     "sheet_id": gs_id,
                     "sheet_name": sheet_name,
                     "batch_size": batch_size,
+                    "pack_size": pack_size,
+                    "engine": engine,
+                    "adaptive": adaptive,
+                    "window": window,
                 },
                 task_id=job_id,
             )
@@ -516,6 +593,10 @@ class ParagraphAPI(APIView):
                     "sheet_id": gs_id,
                     "sheet_name": sheet_name,
                     "batch_size": batch_size,
+                    "pack_size": pack_size,
+                    "engine": engine,
+                    "adaptive": adaptive,
+                    "window": window,
                     "status_url": f"/api/jobs/{task.id}/status/",
                 },
                 status=status.HTTP_202_ACCEPTED,
@@ -526,12 +607,21 @@ class ParagraphAPI(APIView):
         notes = request.data.get("notes") or request.POST.get("notes", "")
         category = request.data.get("category") or request.POST.get("category", "")
         duration = request.data.get("duration") or request.POST.get("duration", "")
+        no_cache = str(request.data.get("no_cache") or "").lower() in ("1", "true", "on", "yes")
 
         if not icon:
             return Response({"error": "icon is required"}, status=status.HTTP_400_BAD_REQUEST)
 
+        if str(request.data.get("stream") or "").lower() in ("1", "true", "on", "yes"):
+            resp = StreamingHttpResponse(
+                _paragraph_events(icon, notes, category, no_cache), content_type="text/event-stream"
+            )
+            resp["Cache-Control"] = "no-cache"
+            resp["X-Accel-Buffering"] = "no"
+            return resp
+
         try:
-            data = generate_heritage_paragraph_with_ssml(icon, notes, category)
+            data = generate_heritage_paragraph_with_ssml(icon, notes, category, bypass_cache=no_cache)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -542,9 +632,9 @@ from django.http import JsonResponse, Http404
 from celery.result import AsyncResult
 from django.core.files.storage import default_storage
 from openpyxl import load_workbook
-from core.models import JobRun
-
-RESULTS_DIR = "uploads/results"
+from core.jobs import job_progress, job_result_page
+from core.models import JobRun, JobRow
+from core.results import RESULT_HEADERS, results_rel as _results_rel
 
 TERMINAL = {"SUCCESS", "FAILURE"}
 
@@ -559,6 +649,8 @@ def job_status(request, job_id):
     out = {"job_id": job_id}
 
     jr = JobRun.objects.filter(job_id=job_id).first()
+    if jr:
+        out["progress"] = job_progress(jr)
 
     # 1) Prefer terminal DB state (handles cases where Celery backend is not visible to web)
     if jr and jr.state in TERMINAL:
@@ -644,13 +736,49 @@ def job_status(request, job_id):
 
 
 
-def _results_rel(job_id: str) -> str:
-    return f"{RESULTS_DIR}/{job_id}.xlsx"
+def _flag(value):
+    if value is None or value == "":
+        return None
+    return str(value).lower() in ("1", "true", "yes", "only")
 
 
 def job_results(request, job_id):
+    """
+    Saved rows of a job, one page at a time:
+      ?after=<row>   cursor; pass back next_cursor from the previous page
+      ?limit=<n>     page size (max 1000)
+      ?category=...  exact category match
+      ?errors=1|0    only failed rows / only successful rows
+    Served from the JobRow index, so page N costs the same as page 1 and works while
+    the job is still running. Jobs saved before rows were indexed fall back to the xlsx.
+    """
     job_id = str(job_id)
     results_rel = _results_rel(job_id)
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 200)), 1000))
+        after = int(request.GET.get("after", 0))
+    except ValueError:
+        return JsonResponse({"error": "after and limit must be integers"}, status=400)
+
+    try:
+        download_url = default_storage.url(results_rel) if default_storage.exists(results_rel) else None
+    except Exception:
+        download_url = None
+
+    if JobRow.objects.filter(job_id=job_id).exists():
+        rows = job_result_page(
+            job_id, after=after, limit=limit,
+            category=request.GET.get("category"), errors=_flag(request.GET.get("errors")),
+        )
+        return JsonResponse({
+            "job_id": job_id,
+            "download_url": download_url,
+            "headers": RESULT_HEADERS + ["state"],
+            "rows": rows,
+            "count": len(rows),
+            "next_cursor": rows[-1]["row"] if len(rows) == limit else None,
+        })
+
     if not default_storage.exists(results_rel):
         raise Http404("Results file not found yet.")
     abs_path = default_storage.path(results_rel)
@@ -665,22 +793,17 @@ def job_results(request, job_id):
         headers = []
 
     rows = []
-    limit = int(request.GET.get("limit", 200))
     for i, tup in enumerate(rows_iter, start=1):
         rows.append({str(headers[j] if j < len(headers) else f"col{j+1}"): tup[j] for j in range(len(tup))})
         if i >= limit:
             break
     wb.close()
 
-    try:
-        download_url = default_storage.url(results_rel)
-    except Exception:
-        download_url = None
-
     return JsonResponse({
         "job_id": job_id,
         "download_url": download_url,
         "headers": headers,
         "rows": rows,
         "count": len(rows),
+        "next_cursor": None,
     })
@@ -1,11 +1,32 @@
 # core/views_jobs.py
-from django.http import JsonResponse, Http404
-from django.views.decorators.http import require_GET
+import uuid
+from django.http import JsonResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+from core.events import open_stream, stream_job_events, TERMINAL
+from core.export import FORMATS, export_stream, gzip_stream, parquet_available
+from core.jobs import STALL_AFTER, job_touch, job_progress, job_snapshot
 from core.models import JobRun
+from core.schemas import structured_stats
+from core.ssml import ssml_stats
+from celery import current_app
 from celery.result import AsyncResult
 
+_ACTIVE = ("PENDING", "RECEIVED", "STARTED", "RETRY")
+
+
+def _state_from_status(status):
+    if status in ("SUCCESS", "FAILURE"):
+        return status
+    if status in _ACTIVE:
+        return "RUNNING"
+    return None
+
 
 def _with_backend_state(job: JobRun):
+    if job.state in TERMINAL:
+        return job.state
+
     # If we have the final callback, use that state first
     if job.handoff_id:
         try:
@@ -14,7 +35,7 @@ def _with_backend_state(job: JobRun):
                 return "SUCCESS"
             if ar.failed():
                 return "FAILURE"
-            if ar.status in ("PENDING", "RECEIVED", "STARTED", "RETRY"):
+            if ar.status in _ACTIVE:
                 return "RUNNING"
         except Exception:
             pass
@@ -26,20 +47,81 @@ def _with_backend_state(job: JobRun):
             return "SUCCESS"
         if ar.failed():
             return "FAILURE"
-        if ar.status in ("PENDING", "RECEIVED", "STARTED", "RETRY"):
+        if ar.status in _ACTIVE:
             return "RUNNING"
     except Exception:
         pass
     return job.state
 
 
+def _bulk_backend_states(jobs):
+    """
+    {pk: state} for a page of jobs with a single MGET against the result backend.
+    Same precedence as _with_backend_state (final callback, then orchestrator);
+    terminal jobs are taken as stored. Falls back to per-job lookups when the
+    backend is not a key/value store.
+    """
+    live = [j for j in jobs if j.state not in TERMINAL]
+    states = {j.pk: j.state for j in jobs}
+    if not live:
+        return states
+
+    backend = current_app.backend
+    if not hasattr(backend, "mget") or not hasattr(backend, "get_key_for_task"):
+        for j in live:
+            states[j.pk] = _with_backend_state(j)
+        return states
+
+    task_ids = []
+    for j in live:
+        if j.handoff_id:
+            task_ids.append(j.handoff_id)
+        task_ids.append(str(j.job_id))
+    try:
+        raw = backend.mget([backend.get_key_for_task(t) for t in task_ids])
+    except Exception:
+        return states
+
+    status = {}
+    for tid, value in zip(task_ids, raw):
+        if not value:
+            status[tid] = "PENDING"  # no meta stored yet, as AsyncResult reports it
+            continue
+        try:
+            status[tid] = backend.decode_result(value).get("status")
+        except Exception:
+            status[tid] = None
+
+    for j in live:
+        found = _state_from_status(status.get(j.handoff_id)) if j.handoff_id else None
+        states[j.pk] = found or _state_from_status(status.get(str(j.job_id))) or j.state
+    return states
+
+
+def _resumable(job: JobRun, state) -> bool:
+    """
+    Resume only a job nothing is working on any more: failed, finished with failed
+    rows, or without progress or a JobRun update for STALL_AFTER (worker crash, deploy).
+    Resuming a live job would dispatch a second run over the same rows and reset the
+    window counters under the first run's batches.
+    """
+    if state == "FAILURE":
+        return True
+    if state == "SUCCESS":
+        return job.rows_failed > 0
+    last = max(filter(None, (job.last_progress_at, job.updated_at)), default=None)
+    return last is None or timezone.now() - last > STALL_AFTER
+
+
 @require_GET
 def api_jobs_list(request):
     limit = int(request.GET.get("limit", 25))
-    qs = JobRun.objects.order_by("-created_at")[:max(1, min(limit, 100))]
+    jobs = list(JobRun.objects.order_by("-created_at")[:max(1, min(limit, 100))])
+    states = _bulk_backend_states(jobs)
     data = []
-    for j in qs:
-        state = _with_backend_state(j)
+    changed = []
+    for j in jobs:
+        state = states[j.pk]
         data.append({
             "job_id": str(j.job_id),
             "state": state,
@@ -49,12 +131,17 @@ def api_jobs_list(request):
             "results": j.results_path,
             "download_url": j.download_url,
             "batches": j.batches,
+            "progress": job_progress(j),
+            "resumable": _resumable(j, state),
             "created_at": j.created_at.isoformat(),
             "updated_at": j.updated_at.isoformat(),
             "error": j.error,
         })
         if state != j.state:
-            JobRun.objects.filter(pk=j.pk).update(state=state)
+            j.state = state
+            changed.append(j)
+    if changed:
+        JobRun.objects.bulk_update(changed, ["state"])
     return JsonResponse({"jobs": data})
 
 
@@ -64,16 +151,110 @@ def api_jobs_detail(request, job_id: str):
         j = JobRun.objects.get(job_id=job_id)
     except JobRun.DoesNotExist:
         raise Http404("job not found")
+    state = _with_backend_state(j)
     return JsonResponse({
         "job_id": str(j.job_id),
-        "state": _with_backend_state(j),
+        "state": state,
         "mode": j.mode,
         "file": j.file_path,
         "sheet_name": j.sheet_name,
         "results": j.results_path,
         "download_url": j.download_url,
         "batches": j.batches,
+        "batch_sizes": j.batch_sizes,
+        "provider_batches": j.provider_batches,
+        "progress": job_progress(j),
+        "ssml": ssml_stats(j.job_id),
+        "structured_outputs": structured_stats(j.job_id),
+        "resumable": _resumable(j, state),
         "created_at": j.created_at.isoformat(),
         "updated_at": j.updated_at.isoformat(),
         "error": j.error,
     })
+
+
+@require_POST
+def api_jobs_resume(request, job_id):
+    """
+    Re-dispatch only the rows of a job that are not checkpointed DONE
+    (e.g. after a worker crash or a deploy mid-job). Same job id, new orchestrator task.
+    409 while the job is still running (see _resumable).
+    """
+    from core.tasks import orchestrate_paragraphs_job
+
+    try:
+        j = JobRun.objects.get(job_id=job_id)
+    except JobRun.DoesNotExist:
+        raise Http404("job not found")
+    if not j.params:
+        return JsonResponse({"error": "job has no stored parameters and cannot be resumed"}, status=400)
+    state = _with_backend_state(j)
+    if not _resumable(j, state):
+        return JsonResponse({"error": f"job is {state} and still running; nothing to resume"}, status=409)
+
+    # Point status lookups at the new orchestrator before it can run (it replaces
+    # handoff_id with its final callback), never at the previous run's results.
+    resume_task_id = str(uuid.uuid4())
+    job_touch(str(j.job_id), state="PENDING", error="", handoff_id=resume_task_id)
+    task = orchestrate_paragraphs_job.apply_async(
+        kwargs={**j.params, "resume_job_id": str(j.job_id)},
+        task_id=resume_task_id,
+    )
+    return JsonResponse({
+        "job_id": str(j.job_id),
+        "status": "queued",
+        "resume_task_id": task.id,
+        "rows_done": j.rows.filter(state="DONE").count(),
+        "status_url": f"/api/jobs/{j.job_id}/status/",
+    }, status=202)
+
+
+@require_GET
+def api_jobs_events(request, job_id):
+    """
+    Server-sent events for one job: a status snapshot now, then a push on every
+    state/progress change (published from job_set_state and save_batch_task).
+    503 when this process already holds MAX_STREAMS streams; the page then polls status_url.
+    """
+    if not JobRun.objects.filter(job_id=job_id).exists():
+        raise Http404("job not found")
+
+    def snapshot():
+        return job_snapshot(JobRun.objects.get(job_id=job_id))
+
+    body = open_stream(stream_job_events(job_id, snapshot))
+    if body is None:
+        resp = JsonResponse({"error": "too many live job streams; poll status_url instead",
+                             "status_url": f"/api/jobs/{job_id}/status/"}, status=503)
+        resp["Retry-After"] = "5"
+        return resp
+    resp = StreamingHttpResponse(body, content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@require_GET
+def api_jobs_export(request, job_id):
+    """
+    /api/jobs/<id>/export/?format=csv|jsonl|parquet
+    Streamed from the saved rows in row order; csv/jsonl are gzipped on the fly when
+    the client accepts it (parquet is already compressed). Memory stays flat.
+    """
+    fmt = (request.GET.get("format") or "csv").lower()
+    if fmt not in FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(FORMATS)}"}, status=400)
+    if fmt == "parquet" and not parquet_available():
+        return JsonResponse({"error": "parquet export needs pyarrow installed on the web image"}, status=501)
+    if not JobRun.objects.filter(job_id=job_id).exists():
+        raise Http404("job not found")
+
+    body = export_stream(job_id, fmt)
+    gz = fmt != "parquet" and "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    resp = StreamingHttpResponse(gzip_stream(body) if gz else body, content_type=FORMATS[fmt])
+    if gz:
+        resp["Content-Encoding"] = "gzip"
+    resp["Vary"] = "Accept-Encoding"
+    resp["Content-Disposition"] = f'attachment; filename="{job_id}.{fmt}"'
+    resp["X-Accel-Buffering"] = "no"
+    return resp
@@ -1,6 +1,24 @@
 import os
+import logging
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 os.environ.setdefault('DJANGO_SETTINGS_MODULE','hmva.settings')
 app=Celery('hmva')
 app.config_from_object('django.conf:settings',namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_init.connect
+def init_http_pools(**_):
+    # Fresh keep-alive pools per prefork child (never reuse sockets from the parent)
+    from core.adapters import transport
+    transport.init_pools()
+
+
+@worker_process_shutdown.connect
+def log_http_stats(**_):
+    from core.adapters import transport
+    for host, st in transport.host_stats().items():
+        logger.info(f"[http] {host} {st}")
@@ -134,6 +134,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Railway’s Redis plugin exposes REDIS_URL; we accept either CELERY_* or REDIS_URL.
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL") or os.getenv("REDIS_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+REDIS_URL = os.getenv("REDIS_URL") or CELERY_BROKER_URL or ""
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_TASK_ACKS_LATE = True
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
@@ -146,13 +147,31 @@ CELERY_ACCEPT_CONTENT = ["json"]
 # Route CPU/API heavy tasks to dedicated queues (matches your workers)
 CELERY_TASK_ROUTES = {
     "core.tasks.process_row_task": {"queue": "openai"},
+    "core.tasks.process_pack_task": {"queue": "openai"},
+    "core.tasks.process_batch_async_task": {"queue": "openai"},
     "core.tasks.save_batch_task": {"queue": "io"},
     "core.tasks.orchestrate_paragraphs_job": {"queue": "default"},
+    "core.tasks.poll_openai_batches_task": {"queue": "default"},
+}
+
+# engine="batch" jobs: how often beat checks their OpenAI provider batches
+CELERY_BEAT_SCHEDULE = {
+    "poll-openai-batches": {
+        "task": "core.tasks.poll_openai_batches_task",
+        "schedule": float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "60")),
+    },
 }
 
 # ---------- Third-party API keys ----------
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# LLM response cache (core.services.llm_cache)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+# "fallback": build SSML locally only when the model's is unusable; "local": always build it locally
+SSML_BUILDER = os.getenv("SSML_BUILDER", "fallback")
 HEYGEN_API_KEY = os.getenv("HEYGEN_API_KEY", "")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "")